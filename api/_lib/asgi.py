@@ -0,0 +1,127 @@
+import asyncio
+import os
+from api._lib.http_utils import (
+    Request, Response, StreamingResponse, close_chunks, empty_response, json_response, next_chunk, sends_content_length,
+)
+from api._lib.loop_runner import submit
+from api._lib.models_handler import handle_models
+from api._lib.chat_handler import handle_chat
+from api._lib.batch_handler import handle_chat_batch
+from api._lib.feedback_handler import handle_feedback, handle_feedback_status
+from api._lib.stats_handler import handle_stats
+
+# ASGI application serving the same routes as the BaseHTTPRequestHandler in
+# api/index.py, e.g. `uvicorn api.index:app`. Requests are awaited concurrently
+# instead of one at a time per worker; keep-alive is left to the ASGI server.
+
+MAX_CONCURRENT_REQUESTS = int(os.environ.get("MAX_CONCURRENT_REQUESTS", "256"))
+QUEUE_TIMEOUT_SEC = float(os.environ.get("REQUEST_QUEUE_TIMEOUT", "30"))
+
+ROUTES = [
+    ("/api/models", handle_models),
+    ("/api/chat/completions", handle_chat),
+    ("/api/chat/batch", handle_chat_batch),
+    ("/api/feedback", handle_feedback),
+    ("/api/feedback/status", handle_feedback_status),
+    ("/api/stats", handle_stats),
+]
+
+
+async def dispatch(request):
+    for suffix, endpoint in ROUTES:
+        if request.path.endswith(suffix):
+            return await endpoint(request)
+    return empty_response(404)
+
+
+class ASGIApp:
+    def __init__(self, max_concurrency=MAX_CONCURRENT_REQUESTS, queue_timeout=QUEUE_TIMEOUT_SEC):
+        self._max_concurrency = max_concurrency
+        self._queue_timeout = queue_timeout
+        self._semaphore = None
+        self.in_flight = 0
+        self.rejected = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _read_body(self, receive):
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return None
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                return b"".join(chunks)
+
+    async def _http(self, scope, receive, send):
+        body = await self._read_body(receive)
+        if body is None:
+            return
+
+        headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        request = Request(
+            scope["method"],
+            scope["path"],
+            headers,
+            body,
+            scope.get("query_string", b"").decode("latin-1"),
+        )
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self._queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            response = json_response({"error": "Server busy, try again later"}, 503, {"Retry-After": "1"})
+            await self._send_response(send, request, response)
+            return
+
+        self.in_flight += 1
+        try:
+            # Endpoints run on the shared handler loop so caches and pools stay on one loop.
+            response = await asyncio.wrap_future(submit(dispatch(request)))
+            await self._send_response(send, request, response)
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    async def _send_response(self, send, request, response: Response):
+        headers = [(k.lower().encode("latin-1"), str(v).encode("latin-1")) for k, v in response.headers.items()]
+        if isinstance(response, StreamingResponse):
+            await send({"type": "http.response.start", "status": response.status, "headers": headers})
+            await self._send_stream(send, response)
+            return
+        if sends_content_length(response.status):
+            headers.append((b"content-length", str(len(response.body)).encode()))
+        await send({"type": "http.response.start", "status": response.status, "headers": headers})
+        body = b"" if request.method == "HEAD" else response.body
+        await send({"type": "http.response.body", "body": body})
+
+    async def _send_stream(self, send, response):
+        try:
+            while True:
+                chunk = await asyncio.wrap_future(submit(next_chunk(response.chunks)))
+                if chunk is None:
+                    break
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            await asyncio.wrap_future(submit(close_chunks(response.chunks)))
+
+
+app = ASGIApp()
@@ -0,0 +1,81 @@
+import asyncio
+import os
+from api._lib.model_utils import resolve_model_aliases
+from api._lib.http_utils import empty_response, error_response, json_response
+from api._lib.client_manager import service_client_async
+from api._lib.tokenizer_cache import get_tokenizer_async
+from api._lib.prompt_builder import render_prompt
+from api._lib.sampling_cache import get_sampling_cache, get_sampling_client
+from api._lib.chat_handler import TINKER_AVAILABLE, ChatContext, complete, positive_int
+
+# Batch chat: N conversations in one request. Aliases are resolved in one bulk
+# lookup, each base model's tokenizer and each model's SamplingClient are fetched
+# once, and all samples are dispatched concurrently under a concurrency cap.
+
+BATCH_CONCURRENCY = int(os.environ.get("CHAT_BATCH_CONCURRENCY", "16"))
+MAX_BATCH_CONCURRENCY = int(os.environ.get("CHAT_BATCH_MAX_CONCURRENCY", "64"))
+MAX_BATCH_SIZE = int(os.environ.get("CHAT_BATCH_MAX_SIZE", "1000"))
+
+async def process_chat_batch(data):
+    if not TINKER_AVAILABLE:
+        return {"error": "Tinker library not available"}
+
+    items = data.get("requests")
+    if not isinstance(items, list) or not items:
+        return {"error": "Missing requests", "status": 400}
+    if len(items) > MAX_BATCH_SIZE:
+        return {"error": f"At most {MAX_BATCH_SIZE} requests per batch", "status": 413}
+
+    try:
+        concurrency = min(positive_int(data, "concurrency", BATCH_CONCURRENCY), MAX_BATCH_CONCURRENCY)
+    except ValueError as e:
+        return {"error": str(e), "status": 400}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    aliases = [item.get("model") for item in items if isinstance(item, dict) and item.get("model")]
+    resolved = await resolve_model_aliases(aliases)
+
+    async with service_client_async() as sc:
+        client_tasks = {}
+
+        def get_client(model_id):
+            # One creation per model, shared by every item that uses it.
+            if model_id not in client_tasks:
+                client_tasks[model_id] = asyncio.ensure_future(get_sampling_client(sc, model_id))
+            return client_tasks[model_id]
+
+        async def run_one(item):
+            try:
+                if not isinstance(item, dict) or not item.get("model") or not item.get("messages"):
+                    return {"error": "Missing model or messages"}
+                model_alias = item["model"]
+                base_model_name, model_to_use = resolved[model_alias]
+                handoff = get_sampling_cache().get_handoff(model_alias, model_to_use, sc.holder)
+                if handoff is not None:
+                    model_to_use, client = handoff
+                tokenizer = await get_tokenizer_async(base_model_name)
+                prompt = render_prompt(base_model_name, item["messages"], tokenizer)
+                ctx = ChatContext(item, model_alias, base_model_name, model_to_use, None, tokenizer, prompt)
+
+                if handoff is None:
+                    client = await get_client(model_to_use)
+                async with semaphore:
+                    return await complete(ctx, client)
+            except Exception as e:
+                return {"error": str(e)}
+
+        results = await asyncio.gather(*(run_one(item) for item in items))
+
+    return {"results": results}
+
+async def handle_chat_batch(request):
+    if request.method != "POST":
+        return empty_response(405)
+
+    try:
+        result = await process_chat_batch(request.json())
+        status = 500 if "error" in result and result["error"] != "Tinker library not available" else 200
+        status = result.pop("status", status)
+        return json_response(result, status)
+    except Exception as e:
+        return error_response(e)
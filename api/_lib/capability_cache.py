@@ -0,0 +1,128 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+from api._lib.client_manager import service_client_async
+
+try:
+    from api import _tinker as tinker
+    TINKER_AVAILABLE = True
+except Exception:
+    try:
+        import tinker
+        TINKER_AVAILABLE = True
+    except Exception:
+        TINKER_AVAILABLE = False
+
+# Supported-model list from get_server_capabilities, shared by alias resolution and
+# /api/models. Entries are fresh for CAPABILITY_TTL_SEC; after that the stale list is
+# served while a background refresh runs. Failed fetches back off exponentially, and
+# the last good list is persisted so a cold start has data immediately.
+
+CAPABILITY_FILE = "/tmp/tinker_capabilities.json"
+CAPABILITY_TTL_SEC = float(os.environ.get("CAPABILITY_TTL", "300"))
+BACKOFF_BASE_SEC = 2.0
+BACKOFF_MAX_SEC = 300.0
+
+
+class CapabilityCache:
+    def __init__(self, path=CAPABILITY_FILE, ttl=CAPABILITY_TTL_SEC, fetcher=None):
+        self.path = path
+        self._ttl = ttl
+        self._fetcher = fetcher
+        self._models = []
+        self._fetched_at = 0.0
+        self._loaded_from_disk = False
+        self._failures = 0
+        self._retry_after = 0.0
+        self._refresh_task = None
+
+    async def _fetch(self):
+        if self._fetcher is not None:
+            return await self._fetcher()
+        if not TINKER_AVAILABLE:
+            raise RuntimeError("Tinker library not available")
+        async with service_client_async() as sc:
+            capabilities = await sc.get_server_capabilities_async()
+        return [m.model_name for m in capabilities.supported_models]
+
+    def _load_from_disk(self):
+        self._loaded_from_disk = True
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            self._models = list(data.get("models", []))
+            self._fetched_at = float(data.get("fetched_at", 0))
+        except (FileNotFoundError, ValueError):
+            pass
+
+    def _save_to_disk(self):
+        try:
+            directory = os.path.dirname(self.path) or "."
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tinker_capabilities.", suffix=".tmp")
+            with os.fdopen(fd, 'w') as f:
+                json.dump({"models": self._models, "fetched_at": self._fetched_at}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Error persisting capabilities: {e}")
+
+    def _is_fresh(self):
+        return bool(self._models) and time.time() - self._fetched_at < self._ttl
+
+    def _in_backoff(self):
+        return time.monotonic() < self._retry_after
+
+    async def refresh(self):
+        try:
+            models = await self._fetch()
+        except Exception as e:
+            self._failures += 1
+            delay = min(BACKOFF_BASE_SEC * 2 ** (self._failures - 1), BACKOFF_MAX_SEC)
+            self._retry_after = time.monotonic() + delay
+            print(f"Error fetching models: {e} (retrying in {delay:.0f}s)")
+            return self._models
+        self._failures = 0
+        self._retry_after = 0.0
+        if models:
+            self._models = models
+            self._fetched_at = time.time()
+            self._save_to_disk()
+        return self._models
+
+    def _start_refresh(self):
+        # Concurrent callers share one in-flight refresh on the same loop.
+        loop = asyncio.get_running_loop()
+        task = self._refresh_task
+        if task is None or task.done() or task.get_loop() is not loop:
+            task = loop.create_task(self.refresh())
+            self._refresh_task = task
+        return task
+
+    async def get_models(self):
+        if not self._loaded_from_disk:
+            self._load_from_disk()
+
+        if self._is_fresh() or self._in_backoff():
+            return self._models
+
+        task = self._start_refresh()
+        if self._models:
+            # Stale-while-revalidate: answer now, refresh in the background.
+            return self._models
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {
+            "models": len(self._models),
+            "age_sec": time.time() - self._fetched_at if self._fetched_at else None,
+            "failures": self._failures,
+            "backoff_sec": max(0.0, self._retry_after - time.monotonic()),
+        }
+
+
+_cache = CapabilityCache()
+
+
+def get_capability_cache():
+    return _cache
@@ -1,9 +1,15 @@
 # Refactored chat handler
-import json
-import asyncio
-import traceback
-from concurrent.futures import ThreadPoolExecutor
+import os
 from api._lib.model_utils import resolve_model_alias
+from api._lib.http_utils import StreamingResponse, empty_response, error_response, json_response, sse_event
+from api._lib.client_manager import service_client_async
+from api._lib.tokenizer_cache import get_tokenizer_async
+from api._lib.prompt_builder import extend_prompt, render_prompt
+from api._lib.conversation_store import get_conversation_store
+from api._lib.stop_sequences import build_stop, emittable_length, token_prefix_length, trim_at_stop
+from api._lib.sampling_cache import get_alias_sampling_client
+from api._lib.inflight import get_sample_flight, sample_key
+from api._lib.completion_cache import get_completion_cache, is_deterministic
 
 try:
     from api import _tinker as tinker
@@ -17,109 +23,232 @@ except Exception:
     except Exception:
         TINKER_AVAILABLE = False
 
-def get_tokenizer_wrapper(model_name: str):
-    from tokenizers import Tokenizer
-    if "Qwen3" in model_name:
-        fallback = "Qwen/Qwen2.5-1.5B-Instruct"
-    elif "Llama-3" in model_name:
-        fallback = "gpt2"
-    else:
-        fallback = model_name
-
-    try:
-        return Tokenizer.from_pretrained(model_name)
-    except:
-        try:
-            return Tokenizer.from_pretrained(fallback)
-        except:
-            return Tokenizer.from_pretrained("gpt2")
-
-async def process_chat(data):
-    if not TINKER_AVAILABLE:
-        return {"error": "Tinker library not available"}
-
+MAX_TOKENS = 512
+TEMPERATURE = 0.7
+MAX_SAMPLES = int(os.environ.get("CHAT_MAX_SAMPLES", "16"))
+# Tokens sampled per round trip when streaming; smaller windows mean earlier first bytes.
+STREAM_WINDOW_TOKENS = int(os.environ.get("CHAT_STREAM_WINDOW", "32"))
+
+
+class ChatContext:
+    def __init__(self, data, model_alias, base_model_name, model_to_use, conversation, tokenizer, prompt):
+        self.data = data
+        self.model_alias = model_alias
+        self.base_model_name = base_model_name
+        self.model_to_use = model_to_use
+        self.conversation = conversation
+        self.tokenizer = tokenizer
+        self.prompt = prompt
+        self.stop = build_stop(prompt.template, tokenizer)
+
+    def sampling_params(self, max_tokens):
+        return types.SamplingParams(
+            max_tokens=max_tokens,
+            temperature=self.data.get("temperature", TEMPERATURE),
+            seed=self.data.get("seed"),
+            stop=self.stop,
+        )
+
+
+async def prepare_chat(data):
+    """Resolves the model and renders the prompt. Returns (context, None) or (None, error)."""
     model_alias = data.get("model")
     messages = data.get("messages")
 
+    # With a conversation_id, messages holds only the turns added since the last call.
+    conversation_id = data.get("conversation_id")
+    conversation = None
+    if conversation_id:
+        conversation = get_conversation_store().get(conversation_id)
+        if conversation is None:
+            return None, {"error": "Unknown or expired conversation_id", "status": 404}
+        model_alias = model_alias or conversation.model_alias
+
     if not model_alias or not messages:
-         return {"error": "Missing model or messages"}
+         return None, {"error": "Missing model or messages"}
 
     base_model_name, model_to_use = await resolve_model_alias(model_alias)
+    if conversation is not None and conversation.base_model != base_model_name:
+        return None, {"error": "conversation_id belongs to a different base model", "status": 409}
 
-    service_client = tinker.ServiceClient()
+    tokenizer = await get_tokenizer_async(base_model_name)
 
-    if model_to_use.startswith("tinker://"):
-        client = service_client.create_sampling_client(model_path=model_to_use)
-    else:
-        client = service_client.create_sampling_client(base_model=model_to_use)
-
-    tokenizer = get_tokenizer_wrapper(base_model_name)
-
-    full_text = ""
-    for msg in messages:
-        role = msg.get("role")
-        content = msg.get("content", "")
-        if role == "system":
-            full_text += f"{content}\n"
-        elif role == "user":
-            full_text += f"User: {content}\nAssistant: "
-        elif role == "assistant":
-            full_text += f"{content}\n"
-
-    # encoding
-    encoding = tokenizer.encode(full_text)
-    tokens = encoding.ids
-
-    model_input = types.ModelInput.from_ints(tokens=tokens)
-    params = types.SamplingParams(max_tokens=512, temperature=0.7)
-
-    future = await client.sample_async(prompt=model_input, sampling_params=params, num_samples=1)
-    if hasattr(future, 'result_async'):
-            result = await future.result_async()
+    if conversation is not None:
+        prompt = extend_prompt(conversation.prompt, messages, tokenizer)
     else:
-            result = future
+        prompt = render_prompt(base_model_name, messages, tokenizer)
+
+    return ChatContext(data, model_alias, base_model_name, model_to_use, conversation, tokenizer, prompt), None
+
+
+def finish_chat(ctx, response):
+    if ctx.conversation is not None or ctx.data.get("store"):
+        prompt = extend_prompt(ctx.prompt, [{"role": "assistant", "content": response["output"]}], ctx.tokenizer)
+        response["conversation_id"] = get_conversation_store().save(
+            ctx.data.get("conversation_id"), ctx.model_alias, ctx.base_model_name, prompt
+        )
+    return response
+
+
+async def _sample(model_id, client, tokens, params, num_samples=1):
+    async def _run():
+        model_input = types.ModelInput.from_ints(tokens=tokens)
+        future = await client.sample_async(prompt=model_input, sampling_params=params, num_samples=num_samples)
+        if hasattr(future, 'result_async'):
+                return await future.result_async()
+        return future
+
+    key = sample_key(model_id, tokens, params, num_samples)
+    cacheable = is_deterministic(params)
+    if cacheable:
+        cached = await get_completion_cache().get_async(model_id, key, types.SampleResponse.model_validate)
+        if cached is not None:
+            return cached
+
+    # Identical concurrent requests (retries, double-clicks) share one sample call.
+    result = await get_sample_flight().do(key, _run)
+    if cacheable:
+        await get_completion_cache().put_async(model_id, key, result)
+    return result
+
+def _mean_logprob(logprobs):
+    if not logprobs:
+        return None
+    return sum(logprobs) / len(logprobs)
+
+def positive_int(data, key, default):
+    """Reads an optional positive integer field, raising ValueError for anything else."""
+    value = data.get(key)
+    if value is None:
+        return default
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        raise ValueError(f"{key} must be a positive integer")
+    return value
+
+def sample_counts(data):
+    """Returns (n, best_of): candidates to return and candidates to sample.
+
+    Raises ValueError for invalid values; handle_chat reports those as 400.
+    """
+    n = positive_int(data, "n", 1)
+    best_of = max(n, positive_int(data, "best_of", n))
+    if best_of > MAX_SAMPLES:
+        raise ValueError(f"best_of (and n) must be at most {MAX_SAMPLES}")
+    return n, best_of
+
+async def complete(ctx, client):
+    n, best_of = sample_counts(ctx.data)
+    # All candidates come from one server call; ranking reuses the returned logprobs.
+    result = await _sample(ctx.model_to_use, client, ctx.prompt.tokens, ctx.sampling_params(MAX_TOKENS), best_of)
+
+    choices = []
+    for seq in result.sequences:
+        output_text, tokens, logprobs, _ = trim_at_stop(seq.tokens, seq.logprobs, ctx.stop, ctx.tokenizer)
+        choices.append({
+            "output": output_text,
+            "logprobs": logprobs,
+            "tokens": tokens,
+            "mean_logprob": _mean_logprob(logprobs),
+        })
+    if best_of > 1:
+        choices.sort(key=lambda c: float("-inf") if c["mean_logprob"] is None else c["mean_logprob"], reverse=True)
+    choices = choices[:n]
+
+    best = choices[0]
+    response = {
+        "output": best["output"],
+        "logprobs": best["logprobs"],
+        "tokens": best["tokens"]
+    }
+    if best_of > 1:
+        response["choices"] = choices
+    return response
 
-    seq = result.sequences[0]
-    output_text = tokenizer.decode(seq.tokens, skip_special_tokens=True)
+async def process_chat(data):
+    if not TINKER_AVAILABLE:
+        return {"error": "Tinker library not available"}
 
-    return {
-        "output": output_text,
-        "logprobs": seq.logprobs,
-        "tokens": seq.tokens
-    }
+    ctx, error = await prepare_chat(data)
+    if error:
+        return error
 
-def run_async(coro):
-    """Runs an async coroutine in a way that works even if an event loop is already running."""
-    try:
-        loop = asyncio.get_running_loop()
-    except RuntimeError:
-        loop = None
-
-    if loop and loop.is_running():
-        with ThreadPoolExecutor(max_workers=1) as executor:
-            future = executor.submit(asyncio.run, coro)
-            return future.result()
-    else:
-        return asyncio.run(coro)
+    async with service_client_async() as sc:
+        ctx.model_to_use, client = await get_alias_sampling_client(sc, ctx.model_alias, ctx.model_to_use)
+        return finish_chat(ctx, await complete(ctx, client))
 
-def handle_chat(req_handler):
-    if req_handler.command != "POST":
-        req_handler.send_response(405)
-        req_handler.end_headers()
-        return
+async def stream_chat(ctx):
+    """Yields SSE events, sampling STREAM_WINDOW_TOKENS at a time and continuing from the output so far."""
+    try:
+        async with service_client_async() as sc:
+            ctx.model_to_use, client = await get_alias_sampling_client(sc, ctx.model_alias, ctx.model_to_use)
+            prompt_tokens = ctx.prompt.tokens
+            out_tokens, out_logprobs = [], []
+            text = ""
+            emitted = 0
+            tokens_emitted = 0
+            done = False
+
+            while not done and len(out_tokens) < MAX_TOKENS:
+                window = min(STREAM_WINDOW_TOKENS, MAX_TOKENS - len(out_tokens))
+                result = await _sample(ctx.model_to_use, client, prompt_tokens + out_tokens, ctx.sampling_params(window))
+
+                seq = result.sequences[0]
+                # Stop strings can straddle windows, so trimming runs over the whole output.
+                text, out_tokens, out_logprobs, stopped = trim_at_stop(
+                    out_tokens + list(seq.tokens), out_logprobs + list(seq.logprobs or []), ctx.stop, ctx.tokenizer
+                )
+                done = stopped or seq.stop_reason == "stop" or not seq.tokens or len(out_tokens) >= MAX_TOKENS
+
+                # Hold back a trailing partial UTF-8 character or stop-string prefix until
+                # the next window settles it.
+                end = len(text) if done else max(emitted, emittable_length(text.rstrip("\ufffd"), ctx.stop))
+                # Tokens behind held-back text may still be trimmed by a stop string, so
+                # only those covered by the emitted text go out; the rest follow later.
+                if done or not ctx.stop or isinstance(ctx.stop[0], int):
+                    confirmed = len(out_tokens)
+                else:
+                    confirmed = token_prefix_length(out_tokens, end, ctx.tokenizer, tokens_emitted)
+                yield sse_event({
+                    "type": "delta",
+                    "text": text[emitted:end],
+                    "tokens": out_tokens[tokens_emitted:confirmed],
+                    "logprobs": out_logprobs[tokens_emitted:confirmed],
+                })
+                emitted = end
+                tokens_emitted = confirmed
+
+        response = finish_chat(ctx, {
+            "output": text,
+            "logprobs": out_logprobs,
+            "tokens": out_tokens
+        })
+        yield sse_event({"type": "done", **response})
+    except Exception as e:
+        yield sse_event({"type": "error", "error": str(e)})
 
-    content_length = int(req_handler.headers['Content-Length'])
-    body = req_handler.rfile.read(content_length).decode('utf-8')
-    data = json.loads(body)
+async def handle_chat(request):
+    if request.method != "POST":
+        return empty_response(405)
 
     try:
-        result = run_async(process_chat(data))
+        data = request.json()
+        try:
+            counts = sample_counts(data)
+        except ValueError as e:
+            return json_response({"error": str(e)}, 400)
+
+        if data.get("stream") and TINKER_AVAILABLE:
+            if counts != (1, 1):
+                return json_response({"error": "n and best_of are not supported with stream"}, 400)
+            ctx, error = await prepare_chat(data)
+            if error:
+                return json_response(error, error.pop("status", 400))
+            headers = {'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache'}
+            return StreamingResponse(stream_chat(ctx), 200, headers)
+
+        result = await process_chat(data)
         status = 500 if "error" in result and result["error"] != "Tinker library not available" else 200
-        req_handler.send_response(status)
-        req_handler.send_header('Content-Type', 'application/json')
-        req_handler.end_headers()
-        req_handler.wfile.write(json.dumps(result).encode())
+        status = result.pop("status", status)
+        return json_response(result, status)
     except Exception as e:
-        req_handler.send_response(500)
-        req_handler.end_headers()
-        req_handler.wfile.write(json.dumps({"error": str(e), "traceback": traceback.format_exc()}).encode())
+        return error_response(e)
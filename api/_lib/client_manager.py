@@ -0,0 +1,216 @@
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+try:
+    from api import _tinker as tinker
+    from api._tinker.lib.client_connection_pool_type import ClientConnectionPoolType
+    TINKER_AVAILABLE = True
+except Exception:
+    try:
+        import tinker
+        from tinker.lib.client_connection_pool_type import ClientConnectionPoolType
+        TINKER_AVAILABLE = True
+    except Exception:
+        TINKER_AVAILABLE = False
+
+# One ServiceClient per process. Creating a ServiceClient opens a Tinker session,
+# starts a heartbeat task and telemetry queue and builds connection pools, so the
+# handlers share a single lazily created instance instead of making one per request.
+
+HEALTH_CHECK_INTERVAL_SEC = 30
+# The SDK's own heartbeat task swallows every failure, so health is judged by a
+# session heartbeat of our own; a client is replaced only after consecutive
+# probes fail, since replacing it drops every cached session built on it.
+PROBE_TIMEOUT_SEC = 10
+MAX_FAILED_PROBES = 2
+
+
+class _ClientEntry:
+    def __init__(self, client):
+        self.client = client
+        self.refcount = 0
+        self.retired = False
+        self.created_at = time.monotonic()
+        self.probing = False
+        self.failed_probes = 0
+
+
+class ServiceClientManager:
+    def __init__(self, factory=None, health_check_interval=HEALTH_CHECK_INTERVAL_SEC, probe=None,
+                 max_failed_probes=MAX_FAILED_PROBES):
+        self._factory = factory
+        self._health_check_interval = health_check_interval
+        self._probe = probe or self._heartbeat
+        self._max_failed_probes = max_failed_probes
+        self._lock = threading.Lock()
+        self._current = None
+        self._entries = {}
+        self._last_health_check = 0.0
+        self.generation = 0
+
+    def _create_client(self):
+        if self._factory is not None:
+            return self._factory()
+        return tinker.ServiceClient()
+
+    @staticmethod
+    def _heartbeat(client):
+        """Sends one session heartbeat without retries; raises if the session is unreachable."""
+        holder = client.holder
+
+        async def _send():
+            with holder.aclient(ClientConnectionPoolType.SESSION) as api:
+                await api.service.session_heartbeat(
+                    session_id=holder.get_session_id(), max_retries=0, timeout=PROBE_TIMEOUT_SEC
+                )
+
+        holder.run_coroutine_threadsafe(_send()).result(timeout=PROBE_TIMEOUT_SEC + 5)
+
+    def _retire(self, entry):
+        entry.retired = True
+        if self._current is entry:
+            self._current = None
+        if entry.refcount == 0:
+            self._close(entry)
+
+    def _close(self, entry):
+        self._entries.pop(id(entry.client), None)
+        try:
+            entry.client.holder.close()
+        except Exception as e:
+            print(f"Error closing service client: {e}")
+
+    def _start_probe(self, entry):
+        # Called with the lock held. The probe is a network round trip, so it runs on
+        # a daemon thread and requests keep using the client meanwhile.
+        if entry.probing or entry.retired:
+            return
+        entry.probing = True
+        threading.Thread(target=self._run_probe, args=(entry,), name="tinker-health-probe", daemon=True).start()
+
+    def _run_probe(self, entry):
+        try:
+            self._probe(entry.client)
+            error = None
+        except Exception as e:
+            error = e
+        with self._lock:
+            entry.probing = False
+            if error is None:
+                entry.failed_probes = 0
+                return
+            entry.failed_probes += 1
+            print(f"Tinker session heartbeat failed ({entry.failed_probes}/{self._max_failed_probes}): {error}")
+            if entry.failed_probes >= self._max_failed_probes and not entry.retired:
+                print("Tinker session is no longer alive, re-creating service client")
+                self._retire(entry)
+            elif not entry.retired:
+                # Confirm or clear the failure without waiting a whole interval.
+                self._last_health_check = 0.0
+
+    def _check_health(self):
+        now = time.monotonic()
+        if now - self._last_health_check < self._health_check_interval:
+            return
+        self._last_health_check = now
+        if self._current is not None:
+            self._start_probe(self._current)
+
+    def acquire(self):
+        with self._lock:
+            if self._current is not None:
+                self._check_health()
+            if self._current is None:
+                entry = _ClientEntry(self._create_client())
+                self._entries[id(entry.client)] = entry
+                self._current = entry
+                self._last_health_check = time.monotonic()
+                self.generation += 1
+            self._current.refcount += 1
+            return self._current.client
+
+    async def acquire_async(self):
+        """acquire() for coroutines: creating a session blocks, so it runs in a worker thread."""
+        with self._lock:
+            if self._current is not None:
+                self._check_health()
+            if self._current is not None:
+                self._current.refcount += 1
+                return self._current.client
+        return await asyncio.to_thread(self.acquire)
+
+    def release(self, client):
+        with self._lock:
+            entry = self._entries.get(id(client))
+            if entry is None:
+                return
+            entry.refcount -= 1
+            if entry.retired and entry.refcount <= 0:
+                self._close(entry)
+
+    def invalidate(self, client=None):
+        """Drops the current client so the next acquire() opens a new session."""
+        with self._lock:
+            entry = self._current if client is None else self._entries.get(id(client))
+            if entry is not None and not entry.retired:
+                self._retire(entry)
+
+    def suspect(self, client):
+        """Probes client's session now, e.g. after a connection error the SDK gave up
+        retrying; the client is replaced only if the probes fail."""
+        with self._lock:
+            entry = self._entries.get(id(client))
+            if entry is not None:
+                self._start_probe(entry)
+
+    @contextmanager
+    def client(self):
+        client = self.acquire()
+        try:
+            yield client
+        except tinker.APIConnectionError:
+            self.suspect(client)
+            raise
+        finally:
+            self.release(client)
+
+    @asynccontextmanager
+    async def client_async(self):
+        client = await self.acquire_async()
+        try:
+            yield client
+        except tinker.APIConnectionError:
+            self.suspect(client)
+            raise
+        finally:
+            self.release(client)
+
+    def stats(self):
+        with self._lock:
+            current = self._current
+            return {
+                "generation": self.generation,
+                "active_refs": current.refcount if current else 0,
+                "age_sec": time.monotonic() - current.created_at if current else None,
+                "failed_probes": current.failed_probes if current else 0,
+                "retired_pending_close": sum(1 for e in self._entries.values() if e.retired),
+            }
+
+
+_manager = ServiceClientManager()
+
+
+def get_client_manager():
+    return _manager
+
+
+def service_client():
+    """Context manager yielding the shared ServiceClient for the duration of a request."""
+    return _manager.client()
+
+
+def service_client_async():
+    """Async context manager form of service_client() for use on an event loop."""
+    return _manager.client_async()
@@ -0,0 +1,201 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from api._lib.registry import add_update_listener
+
+# Cache of sample results for deterministic requests (a seed is set or temperature
+# is 0), where the same checkpoint and prompt always produce the same output. An
+# in-memory LRU sits in front of an optional on-disk tier (COMPLETION_CACHE_DIR)
+# with size-based eviction. Entries are grouped by model id so they can be dropped
+# when an alias moves to a new checkpoint.
+
+MAX_MEMORY_ENTRIES = int(os.environ.get("COMPLETION_CACHE_SIZE", "1024"))
+DISK_CACHE_DIR = os.environ.get("COMPLETION_CACHE_DIR")
+MAX_DISK_BYTES = int(os.environ.get("COMPLETION_CACHE_DISK_BYTES", str(256 * 1024 * 1024)))
+
+
+def is_deterministic(params):
+    return getattr(params, "seed", None) is not None or getattr(params, "temperature", 1) == 0
+
+
+def _model_dir_name(model_id):
+    return hashlib.sha256(model_id.encode()).hexdigest()[:16]
+
+
+class CompletionCache:
+    def __init__(self, max_entries=MAX_MEMORY_ENTRIES, disk_dir=DISK_CACHE_DIR, max_disk_bytes=MAX_DISK_BYTES):
+        self._max_entries = max_entries
+        self._disk_dir = disk_dir
+        self._max_disk_bytes = max_disk_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._keys_by_model = {}
+        self._disk_bytes = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _disk_path(self, model_id, key):
+        return os.path.join(self._disk_dir, _model_dir_name(model_id), key + ".json")
+
+    def _remember(self, model_id, key, value):
+        self._entries[key] = (model_id, value)
+        self._entries.move_to_end(key)
+        self._keys_by_model.setdefault(model_id, set()).add(key)
+        while len(self._entries) > self._max_entries:
+            old_key, (old_model, _) = self._entries.popitem(last=False)
+            self._keys_by_model.get(old_model, set()).discard(old_key)
+
+    def _memory_get(self, key):
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return hit[1]
+        return None
+
+    def _disk_get(self, model_id, key, decode):
+        value = None
+        if self._disk_dir:
+            path = self._disk_path(model_id, key)
+            try:
+                with open(path, 'r') as f:
+                    value = decode(json.load(f))
+                os.utime(path)
+            except (FileNotFoundError, ValueError):
+                value = None
+        with self._lock:
+            if value is not None:
+                self.disk_hits += 1
+                self._remember(model_id, key, value)
+            else:
+                self.misses += 1
+        return value
+
+    def get(self, model_id, key, decode):
+        value = self._memory_get(key)
+        if value is not None:
+            return value
+        return self._disk_get(model_id, key, decode)
+
+    async def get_async(self, model_id, key, decode):
+        """get() for coroutines: the disk tier is read in a worker thread."""
+        value = self._memory_get(key)
+        if value is not None:
+            return value
+        if not self._disk_dir:
+            # No file IO without a disk tier; this only records the miss.
+            return self._disk_get(model_id, key, decode)
+        return await asyncio.to_thread(self._disk_get, model_id, key, decode)
+
+    def _put_disk(self, model_id, key, value):
+        try:
+            self._write_disk(model_id, key, value)
+        except OSError as e:
+            print(f"Error writing completion cache entry: {e}")
+
+    def put(self, model_id, key, value):
+        with self._lock:
+            self._remember(model_id, key, value)
+        if self._disk_dir:
+            self._put_disk(model_id, key, value)
+
+    async def put_async(self, model_id, key, value):
+        with self._lock:
+            self._remember(model_id, key, value)
+        if self._disk_dir:
+            await asyncio.to_thread(self._put_disk, model_id, key, value)
+
+    def _write_disk(self, model_id, key, value):
+        data = json.dumps(value.model_dump(mode="json") if hasattr(value, "model_dump") else value).encode()
+        path = self._disk_path(model_id, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._scan_disk_bytes()
+            else:
+                self._disk_bytes += len(data)
+            over_budget = self._disk_bytes > self._max_disk_bytes
+        if over_budget:
+            self._evict_disk()
+
+    def _disk_files(self):
+        files = []
+        for root, _, names in os.walk(self._disk_dir):
+            for name in names:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    files.append((st.st_mtime, st.st_size, path))
+        return files
+
+    def _scan_disk_bytes(self):
+        return sum(size for _, size, _ in self._disk_files())
+
+    def _evict_disk(self):
+        # Least recently used first (hits touch the file's mtime), down to 90% of budget.
+        files = sorted(self._disk_files())
+        total = sum(size for _, size, _ in files)
+        target = self._max_disk_bytes * 0.9
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._disk_bytes = total
+
+    def invalidate_model(self, model_id):
+        with self._lock:
+            for key in self._keys_by_model.pop(model_id, set()):
+                self._entries.pop(key, None)
+            self._disk_bytes = None
+        if self._disk_dir:
+            shutil.rmtree(os.path.join(self._disk_dir, _model_dir_name(model_id)), ignore_errors=True)
+
+    async def invalidate_model_async(self, model_id):
+        await asyncio.to_thread(self.invalidate_model, model_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "disk_bytes": self._disk_bytes,
+            }
+
+
+_cache = CompletionCache()
+
+
+def get_completion_cache():
+    return _cache
+
+
+def _on_model_entry_updated(alias, old_entry, new_entry):
+    if not old_entry:
+        return
+    old_id = old_entry.get("currentModelId")
+    if old_id and old_id != new_entry.get("currentModelId") and old_id.startswith("tinker://"):
+        _cache.invalidate_model(old_id)
+
+
+add_update_listener(_on_model_entry_updated)
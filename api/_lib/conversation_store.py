@@ -0,0 +1,82 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Server-side chat sessions. Each conversation keeps its rendered prompt with the
+# token ids of every message already encoded, so a client can send a conversation_id
+# plus only its new message and the handler tokenizes just that delta. Conversations
+# expire after CONVERSATION_TTL_SEC idle and the least recently used are evicted once
+# the store holds more than MAX_STORED_TOKENS tokens in total.
+
+CONVERSATION_TTL_SEC = int(os.environ.get("CONVERSATION_TTL", "1800"))
+MAX_STORED_TOKENS = int(os.environ.get("CONVERSATION_MAX_TOKENS", "2000000"))
+
+
+class Conversation:
+    def __init__(self, conversation_id, model_alias, base_model, prompt):
+        self.id = conversation_id
+        self.model_alias = model_alias
+        self.base_model = base_model
+        self.prompt = prompt
+        self.token_count = prompt.token_count
+        self.last_used = time.monotonic()
+
+
+class ConversationStore:
+    def __init__(self, ttl=CONVERSATION_TTL_SEC, max_tokens=MAX_STORED_TOKENS):
+        self._ttl = ttl
+        self._max_tokens = max_tokens
+        self._lock = threading.Lock()
+        self._conversations = OrderedDict()
+        self._total_tokens = 0
+
+    def _drop(self, conversation_id):
+        conversation = self._conversations.pop(conversation_id, None)
+        if conversation is not None:
+            self._total_tokens -= conversation.token_count
+
+    def _evict(self, now):
+        for conversation_id, conversation in list(self._conversations.items()):
+            if now - conversation.last_used <= self._ttl:
+                break
+            self._drop(conversation_id)
+        while self._total_tokens > self._max_tokens and len(self._conversations) > 1:
+            self._drop(next(iter(self._conversations)))
+
+    def get(self, conversation_id):
+        with self._lock:
+            now = time.monotonic()
+            self._evict(now)
+            conversation = self._conversations.get(conversation_id)
+            if conversation is not None:
+                conversation.last_used = now
+                self._conversations.move_to_end(conversation_id)
+            return conversation
+
+    def save(self, conversation_id, model_alias, base_model, prompt):
+        """Stores prompt under conversation_id (a new id if None) and returns the id."""
+        conversation_id = conversation_id or uuid.uuid4().hex
+        conversation = Conversation(conversation_id, model_alias, base_model, prompt)
+        with self._lock:
+            self._drop(conversation_id)
+            self._conversations[conversation_id] = conversation
+            self._total_tokens += conversation.token_count
+            self._evict(time.monotonic())
+        return conversation_id
+
+    def delete(self, conversation_id):
+        with self._lock:
+            self._drop(conversation_id)
+
+    def stats(self):
+        with self._lock:
+            return {"conversations": len(self._conversations), "tokens": self._total_tokens}
+
+
+_store = ConversationStore()
+
+
+def get_conversation_store():
+    return _store
@@ -0,0 +1,85 @@
+import numpy as np
+
+try:
+    from api._tinker import types
+except Exception:
+    try:
+        from tinker import types
+    except Exception:
+        types = None
+
+# Builds training Datums for feedback examples. Every prompt and completion text
+# in a batch is tokenized with one encode_batch call (identical prompts once), and
+# the shifted ids and per-token loss arrays are NumPy slices rather than per-token
+# Python loops; types.Datum converts the ndarrays to TensorData directly.
+
+
+def _encode_texts(tokenizer, texts):
+    unique = list(dict.fromkeys(texts))
+    if not unique:
+        return {}
+    # Prompts carry their template BOS already; completions must not get another.
+    encodings = tokenizer.encode_batch(unique, add_special_tokens=False)
+    return {text: np.asarray(encoding.ids, dtype=np.int64) for text, encoding in zip(unique, encodings)}
+
+
+def build_datum(prompt_ids, completion_ids, advantage, logprobs=None):
+    """Returns (datum, loss_fn) for one prompt/completion pair.
+
+    With sampled logprobs the completion is weighted by advantage under
+    importance_sampling; otherwise it is a cross_entropy target.
+    """
+    full = np.concatenate([prompt_ids, completion_ids])
+    input_ids = full[:-1]
+    target_ids = full[1:]
+    n = len(input_ids)
+    # Position i predicts token i + 1, so the completion's targets start one before it.
+    start = max(0, len(prompt_ids) - 1)
+    end = min(start + len(completion_ids), n)
+
+    if logprobs is None:
+        weights = np.zeros(n, dtype=np.float32)
+        weights[start:end] = 1.0
+        loss_fn = "cross_entropy"
+        loss_in = {"target_tokens": target_ids, "weights": weights}
+    else:
+        advantages = np.zeros(n, dtype=np.float32)
+        advantages[start:end] = advantage
+        lp_vec = np.zeros(n, dtype=np.float32)
+        lp = np.asarray(logprobs, dtype=np.float32)[:end - start]
+        lp_vec[start:start + len(lp)] = lp
+        loss_fn = "importance_sampling"
+        loss_in = {"target_tokens": target_ids, "logprobs": lp_vec, "advantages": advantages}
+
+    datum = types.Datum(model_input=types.ModelInput.from_ints(tokens=input_ids.tolist()), loss_fn_inputs=loss_in)
+    return datum, loss_fn
+
+
+def build_datums(tokenizer, examples):
+    """Builds (datum, loss_fn) pairs for feedback examples.
+
+    Each example has prompt_tokens (the rendered chat prompt) or prompt_text, an
+    advantage, and either completion_tokens (with their sampled logprobs) or
+    completion_text.
+    """
+    texts = []
+    for ex in examples:
+        if ex.get("prompt_tokens") is None:
+            texts.append(ex["prompt_text"])
+        if not ex.get("completion_tokens"):
+            texts.append(ex["completion_text"])
+    encoded = _encode_texts(tokenizer, texts)
+
+    data_batch = []
+    for ex in examples:
+        if ex.get("prompt_tokens") is not None:
+            prompt_ids = np.asarray(ex["prompt_tokens"], dtype=np.int64)
+        else:
+            prompt_ids = encoded[ex["prompt_text"]]
+        completion_tokens = ex.get("completion_tokens")
+        if completion_tokens:
+            completion_ids = np.asarray(completion_tokens, dtype=np.int64)
+        else:
+            completion_ids = encoded[ex["completion_text"]]
+        data_batch.append(build_datum(prompt_ids, completion_ids, float(ex["advantage"]), ex.get("logprobs")))
+    return data_batch
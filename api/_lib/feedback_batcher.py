@@ -0,0 +1,158 @@
+import asyncio
+import os
+from api._lib.model_utils import resolve_model_alias
+from api._lib.registry import update_model_entry_async
+from api._lib.client_manager import service_client_async
+from api._lib.training_pool import get_training_pool
+from api._lib.sampling_cache import get_sampling_cache
+from api._lib.completion_cache import get_completion_cache
+
+try:
+    from api._tinker import types
+except Exception:
+    try:
+        from tinker import types
+    except Exception:
+        types = None
+
+# Per-alias micro-batching of feedback training. Events arriving within
+# FEEDBACK_BATCH_WINDOW seconds of the first one (or until FEEDBACK_BATCH_SIZE
+# datums are queued) are trained together: gradients from one forward_backward per
+# loss function accumulate into a single optim_step, followed by a single checkpoint
+# save and registry update. Every event in the round receives the same new model id.
+# Before the save, the trained weights are handed to chat as an ephemeral
+# SamplingClient, so the alias serves them without waiting on the checkpoint.
+
+BATCH_WINDOW_SEC = float(os.environ.get("FEEDBACK_BATCH_WINDOW", "2"))
+MAX_BATCH_SIZE = int(os.environ.get("FEEDBACK_BATCH_SIZE", "32"))
+LEARNING_RATE = 1e-5
+
+
+class FeedbackRound:
+    def __init__(self, alias, base_model):
+        self.alias = alias
+        self.base_model = base_model
+        self.datums = {}
+        self.size = 0
+        self.waiters = []
+        self.full = asyncio.Event()
+
+    def add(self, data_batch):
+        for datum, loss_fn in data_batch:
+            self.datums.setdefault(loss_fn, []).append(datum)
+        self.size += len(data_batch)
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        return waiter
+
+
+class FeedbackAccumulator:
+    def __init__(self, window=BATCH_WINDOW_SEC, max_size=MAX_BATCH_SIZE):
+        self._window = window
+        self._max_size = max_size
+        self._pending = {}
+        self._round_locks = {}
+        self._tasks = set()
+        self.events = 0
+        self.rounds = 0
+
+    async def submit(self, alias, base_model, data_batch):
+        """Queues (datum, loss_fn) pairs for alias; returns (base_model, new_model_id) once its round is saved."""
+        round_ = self._pending.get(alias)
+        if round_ is None:
+            round_ = FeedbackRound(alias, base_model)
+            self._pending[alias] = round_
+            task = asyncio.create_task(self._run(round_))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        waiter = round_.add(data_batch)
+        self.events += 1
+        if round_.size >= self._max_size:
+            round_.full.set()
+        # Shielded so a disconnected caller doesn't cancel the result other events share.
+        return await asyncio.shield(waiter)
+
+    async def _run(self, round_):
+        try:
+            await asyncio.wait_for(round_.full.wait(), self._window)
+        except asyncio.TimeoutError:
+            pass
+        if self._pending.get(round_.alias) is round_:
+            del self._pending[round_.alias]
+
+        # One round at a time per alias (asyncio.Lock is FIFO), so each resolves the
+        # checkpoint the previous one published instead of training from a stale id.
+        lock = self._round_locks.setdefault(round_.alias, asyncio.Lock())
+        try:
+            async with lock:
+                result = await self._train(round_)
+        except Exception as e:
+            for waiter in round_.waiters:
+                if not waiter.done():
+                    waiter.set_exception(e)
+        else:
+            for waiter in round_.waiters:
+                if not waiter.done():
+                    waiter.set_result(result)
+
+    async def _train(self, round_):
+        # Resolved under the round lock, after any earlier round for the alias has updated the registry.
+        base_model_name, current_model_id = await resolve_model_alias(round_.alias)
+        new_id = current_model_id
+
+        handoff_id = None
+        async with service_client_async() as sc:
+            try:
+                async with get_training_pool().lease(sc, round_.alias, base_model_name, current_model_id) as pooled:
+                    training_client = pooled.client
+                    for l, b in round_.datums.items():
+                        fb = await training_client.forward_backward_async(b, loss_fn=l)
+                        if hasattr(fb, 'result_async'): await fb.result_async()
+
+                    op = await training_client.optim_step_async(types.AdamParams(learning_rate=LEARNING_RATE))
+                    if hasattr(op, 'result_async'): await op.result_async()
+
+                    # Chats for the alias switch to the trained weights while the durable checkpoint saves.
+                    sampler = await self._hand_off(training_client, round_.alias, current_model_id)
+                    if sampler is not None:
+                        handoff_id = f"ephemeral://{round_.alias}/{os.urandom(4).hex()}"
+                        get_sampling_cache().hand_off(round_.alias, current_model_id, handoff_id, sampler, sc.holder)
+
+                    sf = training_client.save_state(name=f"step_{os.urandom(4).hex()}")
+                    if hasattr(sf, 'result_async'):
+                        res = await sf.result_async()
+                    else:
+                        res = sf
+
+                    if hasattr(res, 'path'): new_id = res.path
+                    # Weights moved past current_model_id; without a saved path they match no checkpoint.
+                    pooled.loaded_path = new_id if new_id != current_model_id else None
+
+                self.rounds += 1
+                if sampler is not None and new_id != current_model_id:
+                    # Same weights as the checkpoint, so the first chat on new_id needs no new session.
+                    get_sampling_cache().put(new_id, sampler, sc.holder)
+                await update_model_entry_async(round_.alias, base_model_name, new_id)
+            finally:
+                if handoff_id is not None:
+                    get_sampling_cache().clear_handoff(round_.alias, handoff_id)
+                    await get_completion_cache().invalidate_model_async(handoff_id)
+        return base_model_name, new_id
+
+    async def _hand_off(self, training_client, alias, current_model_id):
+        try:
+            return await training_client.save_weights_and_get_sampling_client_async()
+        except Exception as e:
+            print(f"Error creating sampling client for {alias}, serving {current_model_id} until saved: {e}")
+            return None
+
+    def stats(self):
+        return {"pending": len(self._pending), "events": self.events, "rounds": self.rounds}
+
+
+_accumulator = FeedbackAccumulator()
+
+
+def get_feedback_accumulator():
+    return _accumulator
@@ -1,10 +1,15 @@
-import json
-import os
 import asyncio
-import traceback
-from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
 from api._lib.model_utils import resolve_model_alias
-from api._lib.registry import update_model_entry
+from api._lib.http_utils import empty_response, error_response, json_response
+from api._lib.client_manager import service_client_async
+from api._lib.tokenizer_cache import get_tokenizer_async
+from api._lib.sampling_cache import get_sampling_client
+from api._lib.datum_builder import build_datums
+from api._lib.prompt_builder import render_prompt
+from api._lib.stop_sequences import build_stop, trim_at_stop
+from api._lib.feedback_batcher import get_feedback_accumulator
+from api._lib.feedback_jobs import FeedbackJobQueue
 
 try:
     from api import _tinker as tinker
@@ -18,24 +23,12 @@ except Exception:
     except Exception:
         TINKER_AVAILABLE = False
 
-def get_tokenizer_wrapper(model_name: str):
-    from tokenizers import Tokenizer
-    if "Qwen3" in model_name:
-        fallback = "Qwen/Qwen2.5-1.5B-Instruct"
-    elif "Llama-3" in model_name:
-        fallback = "gpt2"
-    else:
-        fallback = model_name
+async def process_feedback_logic(data, on_stage=None):
+    """Trains the alias on one feedback event; on_stage(name) is awaited as it progresses."""
+    async def stage(name):
+        if on_stage:
+            await on_stage(name)
 
-    try:
-        return Tokenizer.from_pretrained(model_name)
-    except:
-        try:
-            return Tokenizer.from_pretrained(fallback)
-        except:
-            return Tokenizer.from_pretrained("gpt2")
-
-async def process_feedback_logic(data):
     if not TINKER_AVAILABLE:
         raise ImportError("Tinker library not available")
 
@@ -51,165 +44,108 @@ async def process_feedback_logic(data):
 
     base_model_name, current_model_id = await resolve_model_alias(model_alias)
 
-    service_client = tinker.ServiceClient()
-    target_text = ""
-
-    if feedback_type == 'negative':
-            if not correct_output:
-                raise ValueError("Correct output required for negative feedback")
-
-            client = service_client.create_sampling_client(base_model=base_model_name)
-            tokenizer = get_tokenizer_wrapper(base_model_name)
-
-            sys_prompt = "You are a helpful AI assistant."
-            meta_prompt = (
-            f"The user asked: {prompt}. The correct answer is: {correct_output}. "
-            "Explain step-by-step, using Chain of Thought reasoning, how to arrive at this answer. "
-            "Do not output the final answer, only the reasoning steps."
-            )
-
-            full_text = sys_prompt + "\n" + meta_prompt
-            t_toks = tokenizer.encode(full_text).ids
-
-            m_input = types.ModelInput.from_ints(tokens=t_toks)
-            params = types.SamplingParams(max_tokens=1024, temperature=0.7)
-
-            f = await client.sample_async(prompt=m_input, sampling_params=params, num_samples=1)
-            if hasattr(f, 'result_async'):
-                res = await f.result_async()
-            else:
-                res = f
-
-            cot = tokenizer.decode(res.sequences[0].tokens, skip_special_tokens=True)
-            target_text = f"{cot}\n\nAnswer: {correct_output}"
-
-    examples = []
-
-    if tokens and logprobs:
-            examples.append({
-                "prompt_text": prompt,
-                "completion_tokens": tokens,
-                "logprobs": logprobs,
-                "advantage": 1.0 if feedback_type == 'positive' else -1.0
-            })
-
-    if feedback_type == 'negative':
-            examples.append({
-                "prompt_text": prompt,
-                "completion_text": target_text,
-                "advantage": 1.0
-            })
-
-    training_client = await service_client.create_lora_training_client_async(base_model=base_model_name, rank=32)
-
-    if current_model_id.startswith("tinker://"):
-        try:
-            lf = await training_client.load_state_async(current_model_id)
-            if hasattr(lf, 'result_async'): await lf.result_async()
-        except:
-            pass
-
-    tokenizer = get_tokenizer_wrapper(base_model_name)
-    data_batch = []
-
-    for ex in examples:
-        p_text = ex.get("prompt_text")
-        c_text = ex.get("completion_text")
-        c_toks = ex.get("completion_tokens")
-        lp = ex.get("logprobs")
-        adv = ex.get("advantage")
-
-        p_toks = tokenizer.encode(p_text).ids
-
-        if not c_toks:
-            c_toks = tokenizer.encode(c_text).ids
-
-        full = p_toks + c_toks
-        inp_ids = full[:-1]
-        tgt_ids = full[1:]
-
-        adv_vec = [0.0] * len(inp_ids)
-        lp_vec = [0.0] * len(inp_ids)
-        start_idx = max(0, len(p_toks) - 1)
-
-        for i in range(len(c_toks)):
-            idx = start_idx + i
-            if idx < len(adv_vec):
-                adv_vec[idx] = float(adv)
-                if lp and i < len(lp):
-                    lp_vec[idx] = float(lp[i])
-
-        lfn = "importance_sampling" if (lp is not None) else "cross_entropy"
-
-        if lfn == "cross_entropy":
-                w_vec = [0.0] * len(inp_ids)
-                for i in range(len(c_toks)):
-                    idx = start_idx + i
-                    if idx < len(w_vec): w_vec[idx] = 1.0
-                loss_in = {"target_tokens": tgt_ids, "weights": w_vec}
-        else:
-                loss_in = {"target_tokens": tgt_ids, "logprobs": lp_vec, "advantages": adv_vec}
-
-        datum = types.Datum(model_input=types.ModelInput.from_ints(tokens=inp_ids), loss_fn_inputs=loss_in)
-        data_batch.append((datum, lfn))
-
-    new_id = current_model_id
-
-    batches = {}
-    for d, l in data_batch:
-        if l not in batches: batches[l] = []
-        batches[l].append(d)
-
-    for l, b in batches.items():
-            fb = await training_client.forward_backward_async(b, loss_fn=l)
-            if hasattr(fb, 'result_async'): await fb.result_async()
-
-            op = await training_client.optim_step_async(types.AdamParams(learning_rate=1e-5))
-            if hasattr(op, 'result_async'): await op.result_async()
-
-            sf = training_client.save_state(name=f"step_{os.urandom(4).hex()}")
-            if hasattr(sf, 'result_async'):
-                res = await sf.result_async()
-            else:
-                res = sf
-
-            if hasattr(res, 'path'): new_id = res.path
-
-    return base_model_name, new_id
-
-def run_async(coro):
-    """Runs an async coroutine in a way that works even if an event loop is already running."""
-    try:
-        loop = asyncio.get_running_loop()
-    except RuntimeError:
-        loop = None
-
-    if loop and loop.is_running():
-        with ThreadPoolExecutor(max_workers=1) as executor:
-            future = executor.submit(asyncio.run, coro)
-            return future.result()
-    else:
-        return asyncio.run(coro)
-
-def handle_feedback(req_handler):
-    if req_handler.command != "POST":
-        req_handler.send_response(405)
-        req_handler.end_headers()
-        return
-
-    content_length = int(req_handler.headers['Content-Length'])
-    body = req_handler.rfile.read(content_length).decode('utf-8')
-    data = json.loads(body)
+    async with service_client_async() as sc:
+        target_text = ""
+        tokenizer = await get_tokenizer_async(base_model_name)
+        # Chat sampled the conversation through the model's template, so training
+        # rebuilds the same context rather than encoding the bare prompt text.
+        messages = data.get("messages") or [{"role": "user", "content": prompt}]
+        prompt_tokens = render_prompt(base_model_name, messages, tokenizer).tokens
 
-    try:
-        base_model_name, new_model_id = run_async(process_feedback_logic(data))
-        update_model_entry(data.get("model_alias"), base_model_name, new_model_id)
+        if feedback_type == 'negative':
+                if not correct_output:
+                    raise ValueError("Correct output required for negative feedback")
+
+                await stage("generating_target")
+                client = await get_sampling_client(sc, base_model_name)
+
+                sys_prompt = "You are a helpful AI assistant."
+                meta_prompt = (
+                f"The user asked: {prompt}. The correct answer is: {correct_output}. "
+                "Explain step-by-step, using Chain of Thought reasoning, how to arrive at this answer. "
+                "Do not output the final answer, only the reasoning steps."
+                )
+
+                meta = render_prompt(base_model_name, [
+                    {"role": "system", "content": sys_prompt},
+                    {"role": "user", "content": meta_prompt},
+                ], tokenizer)
+                stop = build_stop(meta.template, tokenizer)
+
+                m_input = types.ModelInput.from_ints(tokens=meta.tokens)
+                params = types.SamplingParams(max_tokens=1024, temperature=0.7, stop=stop)
+
+                f = await client.sample_async(prompt=m_input, sampling_params=params, num_samples=1)
+                if hasattr(f, 'result_async'):
+                    res = await f.result_async()
+                else:
+                    res = f
+
+                cot, _, _, _ = trim_at_stop(list(res.sequences[0].tokens), None, stop, tokenizer)
+                target_text = f"{cot}\n\nAnswer: {correct_output}"
+
+        examples = []
+
+        if tokens and logprobs:
+                examples.append({
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": tokens,
+                    "logprobs": logprobs,
+                    "advantage": 1.0 if feedback_type == 'positive' else -1.0
+                })
+
+        if feedback_type == 'negative':
+                examples.append({
+                    "prompt_tokens": prompt_tokens,
+                    "completion_text": target_text,
+                    "advantage": 1.0
+                })
+
+        # Tokenizing long completions is CPU-bound; keep it off the handler loop.
+        data_batch = await asyncio.to_thread(build_datums, tokenizer, examples)
 
-        req_handler.send_response(200)
-        req_handler.send_header('Content-Type', 'application/json')
-        req_handler.end_headers()
-        req_handler.wfile.write(json.dumps({"success": True, "new_model_id": new_model_id}).encode())
+        if not data_batch:
+            return base_model_name, current_model_id
+
+    await stage("training")
+    # Trained together with other events for the alias; the round also updates the registry.
+    return await get_feedback_accumulator().submit(model_alias, base_model_name, data_batch)
+
+_jobs = FeedbackJobQueue(process_feedback_logic)
+
+
+def get_feedback_jobs():
+    return _jobs
+
+
+def _job_status(job):
+    return {k: job.get(k) for k in ("id", "status", "stage", "attempts", "new_model_id", "error", "created_at", "updated_at")}
+
+
+async def handle_feedback(request):
+    if request.method != "POST":
+        return empty_response(405)
+
+    try:
+        data = request.json()
+        if not data.get("model_alias"):
+            return json_response({"error": "Model alias required"}, 400)
+        if data.get("feedback_type") == 'negative' and not data.get("correct_output"):
+            return json_response({"error": "Correct output required for negative feedback"}, 400)
+        # Training takes minutes; the job is queued on disk and polled via /api/feedback/status.
+        job = await _jobs.enqueue(data)
+        return json_response({"success": True, "job_id": job["id"], "status": job["status"]}, 202)
     except Exception as e:
-        req_handler.send_response(500)
-        req_handler.end_headers()
-        req_handler.wfile.write(json.dumps({"error": str(e), "traceback": traceback.format_exc()}).encode())
+        return error_response(e)
+
+
+async def handle_feedback_status(request):
+    if request.method != "GET":
+        return empty_response(405)
+
+    job_id = parse_qs(request.query).get("job_id", [None])[0]
+    _jobs.start()
+    job = await _jobs.get_async(job_id)
+    if job is None:
+        return json_response({"error": "Unknown job id"}, 404)
+    return json_response(_job_status(job))
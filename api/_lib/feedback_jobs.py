@@ -0,0 +1,271 @@
+import asyncio
+import json
+import os
+import re
+import tempfile
+import time
+
+# Durable queue of feedback training jobs. /api/feedback writes the request to disk
+# and returns a job id; a worker task on the handler loop drains the queue and
+# records each job's stage, result or error in its file, which the status endpoint
+# reads back. One JSON file per job (named so that lexical order is arrival order)
+# is replaced atomically on every update, and a job is claimed through an O_EXCL
+# lock file holding the worker's pid. Jobs whose worker died are re-queued on start.
+# Finished jobs move to a done/ subdirectory, so polling only reads pending work;
+# they are pruned after JOB_RETENTION_SEC. File IO (including the fsync per update)
+# runs in worker threads, off the handler loop. With FEEDBACK_WORKER=0 this process
+# only queues jobs and reports their status; another process runs them.
+
+QUEUE_DIR = os.environ.get("FEEDBACK_QUEUE_DIR", "/tmp/feedback_jobs")
+WORKER_ENABLED = os.environ.get("FEEDBACK_WORKER", "1") != "0"
+WORKER_CONCURRENCY = int(os.environ.get("FEEDBACK_WORKERS", "8"))
+MAX_ATTEMPTS = int(os.environ.get("FEEDBACK_JOB_ATTEMPTS", "3"))
+POLL_INTERVAL_SEC = float(os.environ.get("FEEDBACK_QUEUE_POLL", "5"))
+RETRY_BACKOFF_SEC = 10
+JOB_RETENTION_SEC = int(os.environ.get("FEEDBACK_JOB_RETENTION", str(24 * 3600)))
+PRUNE_INTERVAL_SEC = 3600
+
+# Errors that retrying cannot fix (missing library, invalid request data); jobs
+# raising these fail on the first attempt.
+PERMANENT_ERRORS = (ImportError, ValueError, TypeError, KeyError)
+
+_JOB_ID = re.compile(r"^[0-9a-f]+-[0-9a-f]{8}$")
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class FeedbackJobQueue:
+    def __init__(self, runner, directory=QUEUE_DIR, concurrency=WORKER_CONCURRENCY, max_attempts=MAX_ATTEMPTS,
+                 worker_enabled=WORKER_ENABLED):
+        """runner(data, on_stage) is awaited per job (on_stage is a coroutine function) and returns (base_model, new_model_id)."""
+        self._runner = runner
+        self._worker_enabled = worker_enabled
+        self._dir = directory
+        self._done_dir = os.path.join(directory, "done")
+        self._concurrency = concurrency
+        self._max_attempts = max_attempts
+        self._worker = None
+        self._wakeup = None
+        self._running = {}
+        self._not_before = {}
+        self._last_pruned = 0.0
+        self.completed = 0
+        self.failed = 0
+
+    def _path(self, job_id, suffix=".json"):
+        return os.path.join(self._dir, job_id + suffix)
+
+    def _done_path(self, job_id):
+        return os.path.join(self._done_dir, job_id + ".json")
+
+    def _write(self, job, finished=False):
+        job["updated_at"] = time.time()
+        directory = self._done_dir if finished else self._dir
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".job.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(job, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self._done_path(job["id"]) if finished else self._path(job["id"]))
+        except:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        if finished:
+            # The done/ copy is durable first; a crash before this unlink is cleaned up by _recover.
+            self._unlink(self._path(job["id"]))
+
+    @staticmethod
+    def _unlink(path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def get(self, job_id):
+        if not job_id or not _JOB_ID.match(job_id):
+            return None
+        for path in (self._path(job_id), self._done_path(job_id)):
+            try:
+                with open(path, 'r') as f:
+                    return json.load(f)
+            except (FileNotFoundError, ValueError):
+                continue
+        return None
+
+    async def get_async(self, job_id):
+        return await asyncio.to_thread(self.get, job_id)
+
+    async def enqueue(self, data):
+        now = time.time()
+        job = {
+            "id": f"{time.time_ns():x}-{os.urandom(4).hex()}",
+            "status": "queued",
+            "stage": None,
+            "attempts": 0,
+            "data": data,
+            "created_at": now,
+            "new_model_id": None,
+            "error": None,
+        }
+        await asyncio.to_thread(self._write, job)
+        self.start()
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    def _job_ids(self):
+        try:
+            names = os.listdir(self._dir)
+        except FileNotFoundError:
+            return []
+        return sorted(n[:-5] for n in names if n.endswith(".json") and _JOB_ID.match(n[:-5]))
+
+    def _claim(self, job_id):
+        try:
+            fd = os.open(self._path(job_id, ".lock"), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w') as f:
+            f.write(str(os.getpid()))
+        return True
+
+    def _release(self, job_id):
+        self._unlink(self._path(job_id, ".lock"))
+
+    def _prune(self):
+        """Deletes finished jobs older than JOB_RETENTION_SEC, judged by file mtime."""
+        now = time.time()
+        self._last_pruned = now
+        try:
+            names = os.listdir(self._done_dir)
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = os.path.join(self._done_dir, name)
+            try:
+                if now - os.stat(path).st_mtime > JOB_RETENTION_SEC:
+                    os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def _recover(self):
+        """Re-queues running jobs whose worker process is gone."""
+        if time.time() - self._last_pruned > PRUNE_INTERVAL_SEC:
+            self._prune()
+        for job_id in self._job_ids():
+            if job_id in self._running:
+                continue
+            if os.path.exists(self._done_path(job_id)):
+                # Finished, but the worker died before removing the pending copy.
+                self._unlink(self._path(job_id))
+                self._release(job_id)
+                continue
+            job = self.get(job_id)
+            if job is None:
+                continue
+            try:
+                with open(self._path(job_id, ".lock"), 'r') as f:
+                    pid = int(f.read() or 0)
+            except (FileNotFoundError, ValueError):
+                pid = None
+            if pid and (pid != os.getpid()) and _pid_alive(pid):
+                continue
+            if pid is not None:
+                self._release(job_id)
+            if job["status"] == "running":
+                job["status"] = "queued"
+                self._write(job)
+
+    def start(self):
+        """Starts the worker on the running loop if it isn't already draining the queue."""
+        if not self._worker_enabled:
+            return
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.create_task(self._work())
+
+    async def resume(self):
+        """Coroutine form of start() for submitting from outside the loop at process start."""
+        self.start()
+
+    def _claim_next(self, limit):
+        """Claims up to limit queued jobs that are due, in arrival order."""
+        claimed = []
+        for job_id in self._job_ids():
+            if len(claimed) >= limit:
+                break
+            if job_id in self._running or self._not_before.get(job_id, 0) > time.time():
+                continue
+            job = self.get(job_id)
+            if job is None or job["status"] != "queued" or job.get("retry_at", 0) > time.time():
+                continue
+            self._not_before.pop(job_id, None)
+            if self._claim(job_id):
+                claimed.append(job)
+        return claimed
+
+    async def _work(self):
+        await asyncio.to_thread(self._recover)
+        while True:
+            self._wakeup.clear()
+            free = self._concurrency - len(self._running)
+            jobs = await asyncio.to_thread(self._claim_next, free) if free > 0 else []
+            for job in jobs:
+                job_id = job["id"]
+                task = asyncio.create_task(self._run(job))
+                self._running[job_id] = task
+                task.add_done_callback(lambda _, job_id=job_id: self._on_done(job_id))
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), POLL_INTERVAL_SEC)
+            except asyncio.TimeoutError:
+                await asyncio.to_thread(self._recover)
+
+    def _on_done(self, job_id):
+        self._running.pop(job_id, None)
+        self._release(job_id)  # a single unlink
+        self._wakeup.set()
+
+    async def _run(self, job):
+        job["status"] = "running"
+        job["attempts"] += 1
+        await asyncio.to_thread(self._write, job)
+
+        async def on_stage(stage):
+            job["stage"] = stage
+            await asyncio.to_thread(self._write, dict(job))
+
+        try:
+            result = await self._runner(job["data"], on_stage)
+            if isinstance(result, dict):
+                raise ValueError(result.get("error"))
+        except Exception as e:
+            print(f"Feedback job {job['id']} failed: {e}")
+            job["error"] = str(e)
+            if isinstance(e, PERMANENT_ERRORS) or job["attempts"] >= self._max_attempts:
+                job["status"] = "failed"
+                self.failed += 1
+            else:
+                job["status"] = "queued"
+                job["retry_at"] = time.time() + RETRY_BACKOFF_SEC * 2 ** (job["attempts"] - 1)
+                self._not_before[job["id"]] = job["retry_at"]
+        else:
+            job["base_model"], job["new_model_id"] = result
+            job["status"] = "succeeded"
+            job["stage"] = "done"
+            job["error"] = None
+            self.completed += 1
+        await asyncio.to_thread(self._write, job, job["status"] != "queued")
+
+    def stats(self):
+        return {"running": len(self._running), "completed": self.completed, "failed": self.failed}
@@ -0,0 +1,117 @@
+import json
+import traceback
+from api._lib.loop_runner import run_async
+
+# Transport-neutral request/response objects shared by the ASGI app and the
+# BaseHTTPRequestHandler shim, so each endpoint is written once as an async function.
+
+
+class Request:
+    def __init__(self, method, path, headers=None, body=b"", query=""):
+        self.method = method.upper()
+        self.path = path
+        self.query = query
+        self.headers = {k.lower(): v for k, v in (headers or {}).items()}
+        self.body = body
+
+    def json(self):
+        if not self.body:
+            return {}
+        return json.loads(self.body.decode('utf-8'))
+
+
+class Response:
+    def __init__(self, status=200, body=b"", headers=None):
+        self.status = status
+        self.body = body
+        self.headers = dict(headers or {})
+
+
+class StreamingResponse(Response):
+    """Response whose body is produced by an async iterator of byte chunks.
+
+    The iterator is always advanced on the shared handler loop (see next_chunk), so
+    it may hold loop-bound state across chunks.
+    """
+
+    def __init__(self, chunks, status=200, headers=None):
+        super().__init__(status, b"", headers)
+        self.chunks = chunks
+
+
+async def next_chunk(chunks):
+    """Returns the next chunk from an async iterator, or None once it is exhausted."""
+    try:
+        return await chunks.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+async def close_chunks(chunks):
+    if hasattr(chunks, "aclose"):
+        await chunks.aclose()
+
+
+def sse_event(payload):
+    return f"data: {json.dumps(payload)}\n\n".encode()
+
+
+def json_response(payload, status=200, headers=None):
+    all_headers = {'Content-Type': 'application/json'}
+    all_headers.update(headers or {})
+    return Response(status, json.dumps(payload).encode(), all_headers)
+
+
+def error_response(e, status=500):
+    return json_response({"error": str(e), "traceback": traceback.format_exc()}, status)
+
+
+def empty_response(status, headers=None):
+    return Response(status, b"", headers)
+
+
+def read_request(req_handler):
+    path, _, query = req_handler.path.partition("?")
+    content_length = int(req_handler.headers.get('Content-Length') or 0)
+    body = req_handler.rfile.read(content_length) if content_length else b""
+    return Request(req_handler.command, path, dict(req_handler.headers.items()), body, query)
+
+
+def sends_content_length(status):
+    """False for statuses that never carry a body (1xx, 204, 304); RFC 9110 forbids
+    Content-Length on 204 and only allows the 200 body's length on 304."""
+    return status >= 200 and status not in (204, 304)
+
+
+def write_response(req_handler, response):
+    if isinstance(response, StreamingResponse):
+        _write_streaming_response(req_handler, response)
+        return
+
+    req_handler.send_response(response.status)
+    for name, value in response.headers.items():
+        req_handler.send_header(name, value)
+    if sends_content_length(response.status):
+        req_handler.send_header('Content-Length', str(len(response.body)))
+    req_handler.end_headers()
+    if response.body and req_handler.command != "HEAD":
+        req_handler.wfile.write(response.body)
+
+
+def _write_streaming_response(req_handler, response):
+    req_handler.send_response(response.status)
+    for name, value in response.headers.items():
+        req_handler.send_header(name, value)
+    req_handler.send_header('Transfer-Encoding', 'chunked')
+    req_handler.end_headers()
+    try:
+        while True:
+            chunk = run_async(next_chunk(response.chunks))
+            if chunk is None:
+                break
+            if chunk:
+                req_handler.wfile.write(f"{len(chunk):X}\r\n".encode() + chunk + b"\r\n")
+                req_handler.wfile.flush()
+        req_handler.wfile.write(b"0\r\n\r\n")
+    finally:
+        run_async(close_chunks(response.chunks))
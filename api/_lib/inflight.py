@@ -0,0 +1,66 @@
+import asyncio
+import hashlib
+import json
+import threading
+from concurrent.futures import Future
+
+# Single-flight coalescing for sampling. Retries and double-clicks often send the
+# same model, prompt and params concurrently; while one such request is in flight,
+# identical ones await its result instead of issuing their own sample call.
+
+
+def sample_key(model_id, tokens, params, num_samples=1):
+    params_dict = params.model_dump() if hasattr(params, "model_dump") else dict(vars(params))
+    payload = json.dumps([model_id, num_samples, params_dict], sort_keys=True, default=str)
+    digest = hashlib.sha256(payload.encode())
+    digest.update(b"\0")
+    digest.update(",".join(map(str, tokens)).encode())
+    return digest.hexdigest()
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key, coro_factory):
+        """Runs coro_factory() once per key at a time; concurrent callers share its result."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            # Shielded so a cancelled follower doesn't cancel the shared future.
+            return await asyncio.shield(asyncio.wrap_future(future))
+
+        try:
+            result = await coro_factory()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                if self._calls.get(key) is future:
+                    del self._calls[key]
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": len(self._calls), "leaders": self.leaders, "coalesced": self.coalesced}
+
+
+_sample_flight = SingleFlight()
+
+
+def get_sample_flight():
+    return _sample_flight
@@ -0,0 +1,113 @@
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Minimal local stand-in for the Vercel KV / Upstash REST API. It accepts Redis
+# commands as JSON arrays on `/` (one command) and `/pipeline` (a list of commands)
+# and keeps data in memory, which is enough to run KVRegistryBackend locally:
+#
+#   python -m api._lib.kv_standin --port 8079
+#   KV_REST_API_URL=http://127.0.0.1:8079 REGISTRY_BACKEND=kv ...
+
+
+class KVStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._strings = {}
+        self._hashes = {}
+
+    def execute(self, command):
+        name, args = command[0].upper(), [str(a) for a in command[1:]]
+        with self._lock:
+            if name == "PING":
+                return "PONG"
+            if name == "GET":
+                return self._strings.get(args[0])
+            if name == "SET":
+                self._strings[args[0]] = args[1]
+                return "OK"
+            if name == "APPEND":
+                self._strings[args[0]] = self._strings.get(args[0], "") + args[1]
+                return len(self._strings[args[0]])
+            if name == "DEL":
+                removed = 0
+                for key in args:
+                    removed += int(self._strings.pop(key, None) is not None)
+                    removed += int(self._hashes.pop(key, None) is not None)
+                return removed
+            if name == "HGET":
+                return self._hashes.get(args[0], {}).get(args[1])
+            if name == "HMGET":
+                h = self._hashes.get(args[0], {})
+                return [h.get(field) for field in args[1:]]
+            if name == "HSET":
+                h = self._hashes.setdefault(args[0], {})
+                added = 0
+                for i in range(1, len(args) - 1, 2):
+                    added += int(args[i] not in h)
+                    h[args[i]] = args[i + 1]
+                return added
+            if name == "HDEL":
+                h = self._hashes.get(args[0], {})
+                return sum(int(h.pop(field, None) is not None) for field in args[1:])
+            if name == "HGETALL":
+                flat = []
+                for field, value in self._hashes.get(args[0], {}).items():
+                    flat.extend([field, value])
+                return flat
+        raise ValueError(f"ERR unknown command '{name}'")
+
+
+def make_handler(store, token=None):
+    class KVStandinHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _respond(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _run(self, command):
+            try:
+                return {"result": store.execute(command)}
+            except Exception as e:
+                return {"error": str(e)}
+
+        def do_POST(self):
+            if token and self.headers.get('Authorization') != f"Bearer {token}":
+                self._respond(401, {"error": "Unauthorized"})
+                return
+            content_length = int(self.headers.get('Content-Length') or 0)
+            commands = json.loads(self.rfile.read(content_length) or b"[]")
+            if self.path.rstrip("/") == "/pipeline":
+                self._respond(200, [self._run(c) for c in commands])
+            else:
+                self._respond(200, self._run(commands))
+
+    return KVStandinHandler
+
+
+def start_standin(host="127.0.0.1", port=0, token=None):
+    """Starts the stand-in on a daemon thread and returns (server, url)."""
+    server = ThreadingHTTPServer((host, port), make_handler(KVStore(), token))
+    threading.Thread(target=server.serve_forever, name="kv-standin", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Vercel KV REST API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8079)
+    parser.add_argument("--token", default=None)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(KVStore(), args.token))
+    print(f"KV stand-in listening on http://{args.host}:{args.port}")
+    server.serve_forever()
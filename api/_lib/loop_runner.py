@@ -0,0 +1,105 @@
+import asyncio
+import threading
+import time
+
+# A single long-lived event loop on a daemon thread that every handler submits its
+# coroutines to. Because the loop outlives individual requests, async state such as
+# connection pools, caches and in-flight dedup maps can be shared between them.
+
+LAG_PROBE_INTERVAL_SEC = 0.5
+
+
+class HandlerLoop:
+    def __init__(self, lag_probe_interval=LAG_PROBE_INTERVAL_SEC):
+        self._loop = None
+        self._thread = None
+        self._started = False
+        self._lifecycle_lock = threading.Lock()
+        self._lag_probe_interval = lag_probe_interval
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def _ensure_started(self):
+        if self._started:
+            return
+
+        with self._lifecycle_lock:
+            if self._started:
+                return
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._background_thread_func, name="handler-loop", daemon=True)
+            self._thread.start()
+            self._started = True
+
+    def _background_thread_func(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.create_task(self._probe_lag())
+        self._loop.run_forever()
+
+    async def _probe_lag(self):
+        while True:
+            expected = time.monotonic() + self._lag_probe_interval
+            await asyncio.sleep(self._lag_probe_interval)
+            lag = max(0.0, time.monotonic() - expected)
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+
+    def get_loop(self):
+        self._ensure_started()
+        return self._loop
+
+    def _on_done(self, _future):
+        with self._pending_lock:
+            self._pending -= 1
+            self.completed += 1
+
+    def submit(self, coro):
+        """Schedules coro on the handler loop and returns a concurrent.futures.Future."""
+        loop = self.get_loop()
+        with self._pending_lock:
+            self._pending += 1
+            self.submitted += 1
+        future = asyncio.run_coroutine_threadsafe(coro, loop)
+        future.add_done_callback(self._on_done)
+        return future
+
+    def run(self, coro, timeout=None):
+        """Runs coro on the handler loop and blocks the calling thread until it finishes."""
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is not None and running is self._loop:
+            coro.close()
+            raise RuntimeError("run() cannot block on the handler loop from inside it; await the coroutine instead")
+        return self.submit(coro).result(timeout)
+
+    def metrics(self):
+        with self._pending_lock:
+            return {
+                "queue_depth": self._pending,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "loop_lag_sec": self.last_lag,
+                "max_loop_lag_sec": self.max_lag,
+            }
+
+
+_handler_loop = HandlerLoop()
+
+
+def get_handler_loop():
+    return _handler_loop
+
+
+def submit(coro):
+    return _handler_loop.submit(coro)
+
+
+def run_async(coro, timeout=None):
+    """Runs an async coroutine on the shared handler loop from synchronous code."""
+    return _handler_loop.run(coro, timeout)
@@ -1,53 +1,86 @@
-import asyncio
-import os
-from api._lib.registry import get_model_entry, update_model_entry
-
-try:
-    from api import _tinker as tinker
-    TINKER_AVAILABLE = True
-except ImportError:
-    try:
-        import tinker
-        TINKER_AVAILABLE = True
-    except ImportError:
-        TINKER_AVAILABLE = False
+from api._lib.registry import get_model_entries_async, get_model_entry_async, update_model_entry_async
+from api._lib.capability_cache import get_capability_cache
 
 _SUPPORTED_MODELS = []
 
-async def get_supported_models():
-    global _SUPPORTED_MODELS
-    if _SUPPORTED_MODELS:
-        return _SUPPORTED_MODELS
-
-    if not TINKER_AVAILABLE:
-        return []
-
-    try:
-        service_client = tinker.ServiceClient()
-        capabilities = await service_client.get_server_capabilities_async()
-        _SUPPORTED_MODELS = [m.model_name for m in capabilities.supported_models]
-        return _SUPPORTED_MODELS
-    except Exception as e:
-        print(f"Error fetching models: {e}")
-        return []
 
-async def resolve_model_alias(model_alias: str):
-    entry = get_model_entry(model_alias)
-    if entry:
-        return entry["baseModel"], entry["currentModelId"]
+class ModelPrefixIndex:
+    """Trie over '/'-separated path segments of the supported model names."""
 
-    supported = await get_supported_models()
-    if model_alias in supported:
-        return model_alias, model_alias
+    _TERMINAL = object()
+
+    def __init__(self, model_names=()):
+        self._root = {}
+        self.model_names = frozenset(model_names)
+        for name in self.model_names:
+            node = self._root
+            for segment in name.split("/"):
+                node = node.setdefault(segment, {})
+            node[self._TERMINAL] = name
 
-    best_match = None
-    for m in supported:
-        if model_alias.startswith(m + "/"):
-            if best_match is None or len(m) > len(best_match):
-                best_match = m
+    def __contains__(self, model_name):
+        return model_name in self.model_names
 
+    def longest_prefix(self, model_alias: str):
+        """Returns the longest model name m with model_alias starting with m + "/"."""
+        segments = model_alias.split("/")
+        node = self._root
+        best_match = None
+        # The last segment is excluded: a match must be a strict path prefix.
+        for segment in segments[:-1]:
+            node = node.get(segment)
+            if node is None:
+                break
+            best_match = node.get(self._TERMINAL, best_match)
+        return best_match
+
+
+_MODEL_INDEX = ModelPrefixIndex()
+
+def _set_supported_models(models):
+    global _SUPPORTED_MODELS, _MODEL_INDEX
+    if frozenset(models) != _MODEL_INDEX.model_names:
+        _MODEL_INDEX = ModelPrefixIndex(models)
+    _SUPPORTED_MODELS = models
+
+async def get_supported_models():
+    models = await get_capability_cache().get_models()
+    if models is not _SUPPORTED_MODELS:
+        _set_supported_models(models)
+    return _SUPPORTED_MODELS
+
+async def _resolve_unregistered(model_alias: str):
+    if model_alias in _MODEL_INDEX:
+        return model_alias, model_alias
+
+    best_match = _MODEL_INDEX.longest_prefix(model_alias)
     if best_match:
-        update_model_entry(model_alias, best_match, best_match)
+        await update_model_entry_async(model_alias, best_match, best_match)
         return best_match, best_match
 
     return model_alias, model_alias
+
+async def resolve_model_alias(model_alias: str):
+    entry = await get_model_entry_async(model_alias)
+    if entry:
+        return entry["baseModel"], entry["currentModelId"]
+
+    await get_supported_models()
+    return await _resolve_unregistered(model_alias)
+
+async def resolve_model_aliases(model_aliases):
+    """Resolves many aliases at once, with a single registry read for all of them."""
+    entries = await get_model_entries_async(list(dict.fromkeys(model_aliases)))
+    if any(not entries.get(alias) for alias in model_aliases):
+        await get_supported_models()
+
+    resolved = {}
+    for alias in model_aliases:
+        if alias in resolved:
+            continue
+        entry = entries.get(alias)
+        if entry:
+            resolved[alias] = (entry["baseModel"], entry["currentModelId"])
+        else:
+            resolved[alias] = await _resolve_unregistered(alias)
+    return resolved
@@ -1,20 +1,10 @@
 # Refactored models handler to be a function, not a class
+import hashlib
 import json
-import asyncio
-import traceback
-from concurrent.futures import ThreadPoolExecutor
-
-try:
-    from api import _tinker as tinker
-    TINKER_AVAILABLE = True
-except Exception:
-    # Catch ImportError, SyntaxError, TypeError, etc.
-    # If the environment is incompatible (e.g. old python version), we fall back.
-    try:
-        import tinker
-        TINKER_AVAILABLE = True
-    except Exception:
-        TINKER_AVAILABLE = False
+import os
+import time
+from api._lib.capability_cache import get_capability_cache
+from api._lib.http_utils import Response, empty_response, error_response
 
 FALLBACK_MODELS = [
     "Qwen/Qwen3-235B-A22B-Instruct-2507",
@@ -36,60 +26,66 @@ FALLBACK_MODELS = [
 async def list_models():
     # Always return fallback models if Tinker is not available or if request fails
     # This ensures the UI is usable even without a valid API key for Tinker
-    models = []
-
-    if TINKER_AVAILABLE:
-        try:
-            service_client = tinker.ServiceClient()
-            # Attempt to fetch real models, but fallback if it fails (e.g. auth error)
-            capabilities = await service_client.get_server_capabilities_async()
-            models = [m.model_name for m in capabilities.supported_models]
-        except Exception:
-            # Fallback to hardcoded list
-            pass
+    try:
+        # Shared with alias resolution; serves a stale or persisted list while refreshing
+        models = await get_capability_cache().get_models()
+    except Exception:
+        # Fallback to hardcoded list
+        models = []
 
     if not models:
         models = FALLBACK_MODELS
 
     return {"models": models}
 
-def run_async(coro):
-    """Runs an async coroutine in a way that works even if an event loop is already running."""
-    try:
-        loop = asyncio.get_running_loop()
-    except RuntimeError:
-        loop = None
+# The serialized response is memoized per model list and tagged with a content
+# hash, so repeat page loads within max-age get a 304 without touching the SDK.
+MODELS_MAX_AGE_SEC = int(os.environ.get("MODELS_MAX_AGE", "60"))
+
+_memo_models = None
+_memo_body = None
+_memo_etag = None
+_memo_built_at = 0.0
+
+def _cache_headers(etag):
+    return {
+        'ETag': etag,
+        'Cache-Control': f"public, max-age={MODELS_MAX_AGE_SEC}, stale-while-revalidate={MODELS_MAX_AGE_SEC * 5}",
+    }
 
-    if loop and loop.is_running():
-        # If we are in a running loop, we can't use asyncio.run().
-        # We spawn a thread to run the coroutine in a new loop.
-        with ThreadPoolExecutor(max_workers=1) as executor:
-            future = executor.submit(asyncio.run, coro)
-            return future.result()
-    else:
-        return asyncio.run(coro)
+def _etag_matches(if_none_match, etag):
+    if not if_none_match or not etag:
+        return False
+    candidates = [t.strip() for t in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
 
-def handle_models(req_handler):
+def _memoized_body(models):
+    global _memo_models, _memo_body, _memo_etag, _memo_built_at
+    if models is not _memo_models:
+        body = json.dumps({"models": models}).encode()
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        _memo_models, _memo_body, _memo_etag = models, body, etag
+    _memo_built_at = time.monotonic()
+    return _memo_body, _memo_etag
+
+async def handle_models(request):
     try:
-        if req_handler.command != "GET":
-            req_handler.send_response(405)
-            req_handler.end_headers()
-            return
+        # HEAD gets the same headers; the transports drop the body.
+        if request.method not in ("GET", "HEAD"):
+            return empty_response(405)
 
-        result = run_async(list_models())
-        # Since we always return a list (fallback or real), status is 200
-        status = 200
+        if_none_match = request.headers.get('if-none-match')
+        fresh = time.monotonic() - _memo_built_at < MODELS_MAX_AGE_SEC
+        if fresh and _etag_matches(if_none_match, _memo_etag):
+            return empty_response(304, _cache_headers(_memo_etag))
 
-        req_handler.send_response(status)
-        req_handler.send_header('Content-Type', 'application/json')
-        req_handler.end_headers()
-        req_handler.wfile.write(json.dumps(result).encode())
+        result = await list_models()
+        body, etag = _memoized_body(result["models"])
+        if _etag_matches(if_none_match, etag):
+            return empty_response(304, _cache_headers(etag))
+        # Since we always return a list (fallback or real), status is 200
+        headers = {'Content-Type': 'application/json'}
+        headers.update(_cache_headers(etag))
+        return Response(200, body, headers)
     except Exception as e:
-        req_handler.send_response(500)
-        req_handler.send_header('Content-Type', 'application/json')
-        req_handler.end_headers()
-        error_response = {
-            "error": str(e),
-            "traceback": traceback.format_exc()
-        }
-        req_handler.wfile.write(json.dumps(error_response).encode())
+        return error_response(e)
@@ -0,0 +1,178 @@
+# Chat prompt rendering. Messages are rendered into segments in one pass with a
+# per-model-family chat template and each segment is tokenized separately, so the
+# prompt costs O(total length) and later stages can reuse per-message token ids.
+
+
+class ChatTemplate:
+    def __init__(self, name, message_format, generation_prefix="", bos="", role_formats=None, special_tokens=(),
+                 end_of_turn=(), stop_strings=()):
+        self.name = name
+        self.message_format = message_format
+        self.generation_prefix = generation_prefix
+        self.bos = bos
+        self.role_formats = role_formats or {}
+        self.special_tokens = tuple(special_tokens)
+        # Special tokens that close the assistant's turn, and plain-text markers of a
+        # new turn for templates without special tokens.
+        self.end_of_turn = tuple(end_of_turn)
+        self.stop_strings = tuple(stop_strings)
+
+    def render_message(self, role, content):
+        fmt = self.role_formats.get(role, self.message_format)
+        return fmt.format(role=role, content=content)
+
+    def supported_by(self, tokenizer):
+        # Templates with special tokens only make sense if the tokenizer knows them;
+        # a fallback tokenizer from another family would split them into plain text.
+        return all(tokenizer.token_to_id(t) is not None for t in self.special_tokens)
+
+
+PLAIN_TEMPLATE = ChatTemplate(
+    "plain",
+    message_format="{content}\n",
+    role_formats={"user": "User: {content}\nAssistant: "},
+    stop_strings=("\nUser:", "\nAssistant:"),
+)
+
+# Llama 3 base models saw <|begin_of_text|> at the start of every pretraining document.
+LLAMA3_BASE_TEMPLATE = ChatTemplate(
+    "llama3-base",
+    message_format=PLAIN_TEMPLATE.message_format,
+    role_formats=PLAIN_TEMPLATE.role_formats,
+    bos="<|begin_of_text|>",
+    special_tokens=("<|begin_of_text|>",),
+    stop_strings=PLAIN_TEMPLATE.stop_strings,
+)
+
+QWEN3_TEMPLATE = ChatTemplate(
+    "qwen3",
+    message_format="<|im_start|>{role}\n{content}<|im_end|>\n",
+    generation_prefix="<|im_start|>assistant\n",
+    special_tokens=("<|im_start|>", "<|im_end|>"),
+    end_of_turn=("<|im_end|>",),
+)
+
+# Hybrid Qwen3 models open every turn with a <think> block unless it is already
+# closed; an empty one is Qwen3's own non-thinking mode, so replies start at once
+# and no chain-of-thought reaches the UI or feedback training.
+QWEN3_NO_THINK_TEMPLATE = ChatTemplate(
+    "qwen3-no-think",
+    message_format=QWEN3_TEMPLATE.message_format,
+    generation_prefix="<|im_start|>assistant\n<think>\n\n</think>\n\n",
+    special_tokens=QWEN3_TEMPLATE.special_tokens,
+    end_of_turn=QWEN3_TEMPLATE.end_of_turn,
+)
+
+LLAMA3_TEMPLATE = ChatTemplate(
+    "llama3",
+    message_format="<|start_header_id|>{role}<|end_header_id|>\n\n{content}<|eot_id|>",
+    generation_prefix="<|start_header_id|>assistant<|end_header_id|>\n\n",
+    bos="<|begin_of_text|>",
+    special_tokens=("<|begin_of_text|>", "<|start_header_id|>", "<|end_header_id|>", "<|eot_id|>"),
+    end_of_turn=("<|eot_id|>", "<|eom_id|>"),
+)
+
+# Training type of each model in the Tinker lineup. Base models never saw the chat
+# templates' headers and end-of-turn tokens, so they get the plain template, as do
+# models missing from this table.
+INSTRUCT, HYBRID, BASE = "instruct", "hybrid", "base"
+MODEL_TRAINING_TYPES = {
+    "Qwen/Qwen3-235B-A22B-Instruct-2507": INSTRUCT,
+    "Qwen/Qwen3-30B-A3B-Instruct-2507": INSTRUCT,
+    "Qwen/Qwen3-30B-A3B": HYBRID,
+    "Qwen/Qwen3-30B-A3B-Base": BASE,
+    "Qwen/Qwen3-32B": HYBRID,
+    "Qwen/Qwen3-8B": HYBRID,
+    "Qwen/Qwen3-8B-Base": BASE,
+    "Qwen/Qwen3-4B-Instruct-2507": INSTRUCT,
+    "meta-llama/Llama-3.3-70B": INSTRUCT,
+    "meta-llama/Llama-3.1-70B": BASE,
+    "meta-llama/Llama-3.1-8B": BASE,
+    "meta-llama/Llama-3.1-8B-Instruct": INSTRUCT,
+    "meta-llama/Llama-3.2-3B": BASE,
+    "meta-llama/Llama-3.2-1B": BASE,
+}
+
+
+def get_chat_template(model_name: str, tokenizer=None):
+    training_type = MODEL_TRAINING_TYPES.get(model_name, BASE)
+    if training_type == BASE:
+        template = LLAMA3_BASE_TEMPLATE if "Llama-3" in model_name else PLAIN_TEMPLATE
+    elif "Qwen3" in model_name:
+        template = QWEN3_NO_THINK_TEMPLATE if training_type == HYBRID else QWEN3_TEMPLATE
+    elif "Llama-3" in model_name:
+        template = LLAMA3_TEMPLATE
+    else:
+        template = PLAIN_TEMPLATE
+
+    if tokenizer is not None and not template.supported_by(tokenizer):
+        return PLAIN_TEMPLATE
+    return template
+
+
+class RenderedPrompt:
+    def __init__(self, template, prefix_ids, message_ids, suffix_ids, segments):
+        self.template = template
+        self.prefix_ids = prefix_ids
+        self.message_ids = message_ids
+        self.suffix_ids = suffix_ids
+        self.segments = segments
+
+    @property
+    def text(self):
+        return "".join(self.segments)
+
+    @property
+    def token_count(self):
+        return len(self.prefix_ids) + sum(len(ids) for ids in self.message_ids) + len(self.suffix_ids)
+
+    @property
+    def tokens(self):
+        tokens = list(self.prefix_ids)
+        for ids in self.message_ids:
+            tokens.extend(ids)
+        tokens.extend(self.suffix_ids)
+        return tokens
+
+
+def render_messages(template, messages):
+    segments = []
+    for msg in messages:
+        role = msg.get("role")
+        if role not in ("system", "user", "assistant"):
+            continue
+        segments.append(template.render_message(role, msg.get("content", "")))
+    return segments
+
+
+def encode_segments(tokenizer, segments):
+    if not segments:
+        return []
+    return [e.ids for e in tokenizer.encode_batch(segments, add_special_tokens=False)]
+
+
+def render_prompt(model_name: str, messages, tokenizer):
+    template = get_chat_template(model_name, tokenizer)
+    message_segments = render_messages(template, messages)
+    encoded = encode_segments(tokenizer, [template.bos, *message_segments, template.generation_prefix])
+    return RenderedPrompt(
+        template,
+        prefix_ids=encoded[0],
+        message_ids=encoded[1:-1],
+        suffix_ids=encoded[-1],
+        segments=[template.bos, *message_segments, template.generation_prefix],
+    )
+
+
+def extend_prompt(prompt, messages, tokenizer):
+    """Returns a new RenderedPrompt with messages appended, encoding only the new ones."""
+    new_segments = render_messages(prompt.template, messages)
+    new_ids = encode_segments(tokenizer, new_segments)
+    prefix, suffix = prompt.segments[0], prompt.segments[-1]
+    return RenderedPrompt(
+        prompt.template,
+        prefix_ids=prompt.prefix_ids,
+        message_ids=prompt.message_ids + new_ids,
+        suffix_ids=prompt.suffix_ids,
+        segments=[prefix, *prompt.segments[1:-1], *new_segments, suffix],
+    )
@@ -1,32 +1,66 @@
-import os
-import json
+import asyncio
+from api._lib.registry_backends import create_backend
 
 # Simple Registry using /tmp for MVP (Ephemeral on Serverless)
-# In production, use Vercel KV
+# In production, use Vercel KV: set KV_REST_API_URL / KV_REST_API_TOKEN (or
+# REGISTRY_BACKEND=kv). Locally the default is an append-only journal under /tmp
+# (REGISTRY_BACKEND=journal); REGISTRY_BACKEND=file rewrites a single JSON file and
+# REGISTRY_BACKEND=memory keeps everything in-process.
 
-REGISTRY_FILE = "/tmp/model_registry.json"
+_backend = None
+
+# Callbacks run after an alias is updated, as listener(alias, old_entry, new_entry).
+_update_listeners = []
+
+def add_update_listener(listener):
+    _update_listeners.append(listener)
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = create_backend()
+    return _backend
+
+def set_backend(backend):
+    global _backend
+    _backend = backend
 
 def get_registry():
-    if not os.path.exists(REGISTRY_FILE):
-        return {}
-    try:
-        with open(REGISTRY_FILE, 'r') as f:
-            return json.load(f)
-    except:
-        return {}
+    return get_backend().all()
 
 def save_registry(registry):
-    with open(REGISTRY_FILE, 'w') as f:
-        json.dump(registry, f)
+    get_backend().replace_all(registry)
 
 def get_model_entry(alias):
-    reg = get_registry()
-    return reg.get(alias)
+    return get_backend().get(alias)
+
+def get_model_entries(aliases):
+    return get_backend().get_many(aliases)
+
+def get_model_lineage(alias):
+    return get_backend().lineage(alias)
 
 def update_model_entry(alias, base_model, current_model_id):
-    reg = get_registry()
-    reg[alias] = {
+    new_entry = {
         "baseModel": base_model,
         "currentModelId": current_model_id
     }
-    save_registry(reg)
+    old_entry = get_backend().put(alias, new_entry)
+
+    for listener in _update_listeners:
+        try:
+            listener(alias, old_entry, new_entry)
+        except Exception as e:
+            print(f"Error in registry update listener: {e}")
+
+# Backends do file or network IO (fsync, KV round trips), so coroutines on the
+# shared handler loop use these wrappers, which run the call in a worker thread.
+
+async def get_model_entry_async(alias):
+    return await asyncio.to_thread(get_model_entry, alias)
+
+async def get_model_entries_async(aliases):
+    return await asyncio.to_thread(get_model_entries, aliases)
+
+async def update_model_entry_async(alias, base_model, current_model_id):
+    await asyncio.to_thread(update_model_entry, alias, base_model, current_model_id)
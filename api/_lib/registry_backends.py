@@ -0,0 +1,458 @@
+import os
+import json
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Storage backends for the model registry. Each backend maps an alias to an entry
+# dict ({"baseModel": ..., "currentModelId": ...}) and implements the same small
+# interface, so api/_lib/registry.py can switch between them with REGISTRY_BACKEND.
+
+REGISTRY_FILE = "/tmp/model_registry.json"
+REGISTRY_JOURNAL = "/tmp/model_registry.log"
+REVALIDATE_INTERVAL_SEC = 1.0
+
+COMPACT_THRESHOLD_BYTES = int(os.environ.get("REGISTRY_COMPACT_BYTES", str(1024 * 1024)))
+MAX_LINEAGE = int(os.environ.get("REGISTRY_MAX_LINEAGE", "100"))
+
+KV_HASH_KEY = "model_registry"
+KV_CACHE_TTL_SEC = float(os.environ.get("KV_CACHE_TTL", "5"))
+
+
+class RegistryBackend:
+    def get(self, alias):
+        raise NotImplementedError
+
+    def get_many(self, aliases):
+        return {alias: self.get(alias) for alias in aliases}
+
+    def put(self, alias, entry):
+        """Stores entry for alias and returns the entry it replaced (or None)."""
+        raise NotImplementedError
+
+    def all(self):
+        raise NotImplementedError
+
+    def replace_all(self, registry):
+        raise NotImplementedError
+
+    def lineage(self, alias):
+        """Returns the alias's checkpoint history, oldest first."""
+        entry = self.get(alias)
+        return [entry] if entry else []
+
+
+class MemoryRegistryBackend(RegistryBackend):
+    def __init__(self, initial=None):
+        self._lock = threading.Lock()
+        self._registry = dict(initial or {})
+
+    def get(self, alias):
+        with self._lock:
+            return self._registry.get(alias)
+
+    def put(self, alias, entry):
+        with self._lock:
+            old_entry = self._registry.get(alias)
+            self._registry[alias] = entry
+            return old_entry
+
+    def all(self):
+        with self._lock:
+            return dict(self._registry)
+
+    def replace_all(self, registry):
+        with self._lock:
+            self._registry = dict(registry)
+
+
+class FileRegistryBackend(RegistryBackend):
+    """JSON file held in memory, revalidated by mtime and rewritten atomically.
+
+    The file is only re-read when its mtime/size changes (checked at most every
+    REVALIDATE_INTERVAL_SEC). Writes happen under an exclusive file lock and go to a
+    temp file that is renamed over the registry, so readers never see a partial file
+    and concurrent workers don't lose updates.
+    """
+
+    def __init__(self, path=REGISTRY_FILE):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self._registry = {}
+        self._signature = None
+        self._last_validated = 0.0
+        self._lock = threading.RLock()
+
+    def _file_signature(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    @contextmanager
+    def _file_lock(self, shared=False):
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _revalidate(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_validated < REVALIDATE_INTERVAL_SEC:
+            return self._registry
+        self._last_validated = now
+
+        signature = self._file_signature()
+        if signature == self._signature:
+            return self._registry
+        if signature is None:
+            self._registry, self._signature = {}, None
+            return self._registry
+        try:
+            with open(self.path, 'r') as f:
+                self._registry = json.load(f)
+        except:
+            self._registry = {}
+        self._signature = signature
+        return self._registry
+
+    def _write_atomic(self, registry):
+        directory = os.path.dirname(self.path) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".model_registry.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(registry, f)
+            os.replace(tmp_path, self.path)
+        except:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        self._registry = registry
+        self._signature = self._file_signature()
+        self._last_validated = time.monotonic()
+
+    def get(self, alias):
+        with self._lock:
+            return self._revalidate().get(alias)
+
+    def put(self, alias, entry):
+        with self._lock, self._file_lock():
+            # Re-read under the file lock so updates from other workers are kept.
+            reg = dict(self._revalidate(force=True))
+            old_entry = reg.get(alias)
+            reg[alias] = entry
+            self._write_atomic(reg)
+            return old_entry
+
+    def all(self):
+        with self._lock:
+            return dict(self._revalidate())
+
+    def replace_all(self, registry):
+        with self._lock, self._file_lock():
+            self._write_atomic(dict(registry))
+
+
+class JournalRegistryBackend(RegistryBackend):
+    """Append-only registry log with periodic compaction.
+
+    Each update appends one JSON line to the journal, so writes cost the same no
+    matter how many aliases exist. State is rebuilt from the last snapshot plus the
+    journal on startup, and other workers' appends are picked up by tailing the
+    journal. Once the journal passes COMPACT_THRESHOLD_BYTES a background thread
+    folds it into a new snapshot. Each alias keeps its checkpoint lineage (up to
+    MAX_LINEAGE entries).
+    """
+
+    def __init__(self, journal_path=REGISTRY_JOURNAL, snapshot_path=None, compact_threshold=COMPACT_THRESHOLD_BYTES):
+        self.journal_path = journal_path
+        self.snapshot_path = snapshot_path or os.path.splitext(journal_path)[0] + ".snapshot.json"
+        self.lock_path = journal_path + ".lock"
+        self._compact_threshold = compact_threshold
+        self._lock = threading.RLock()
+        self._registry = {}
+        self._lineage = {}
+        self._offset = 0
+        self._inode = None
+        self._last_validated = 0.0
+        self._compacting = False
+        self._reload()
+
+    _file_lock = FileRegistryBackend._file_lock
+
+    def _apply(self, record):
+        alias, entry = record["alias"], record["entry"]
+        self._registry[alias] = entry
+        history = self._lineage.setdefault(alias, [])
+        if not history or history[-1] != entry:
+            history.append(entry)
+            del history[:-MAX_LINEAGE]
+
+    def _read_journal(self, f):
+        # Only consume complete lines; a partially written tail is picked up later.
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            self._offset += len(line)
+            try:
+                self._apply(json.loads(line))
+            except (ValueError, KeyError):
+                continue
+
+    def _reload(self, locked=False):
+        # Snapshot and journal must come from the same compaction, so unless the caller
+        # already holds the file lock, compaction is held off while both are read.
+        if not locked:
+            with self._file_lock(shared=True):
+                return self._reload(locked=True)
+
+        self._registry, self._lineage = {}, {}
+        try:
+            with open(self.snapshot_path, 'r') as f:
+                snapshot = json.load(f)
+            self._registry = snapshot.get("registry", {})
+            self._lineage = snapshot.get("lineage", {})
+        except (FileNotFoundError, ValueError):
+            pass
+
+        self._offset = 0
+        try:
+            with open(self.journal_path, 'rb') as f:
+                self._inode = os.fstat(f.fileno()).st_ino
+                self._read_journal(f)
+        except FileNotFoundError:
+            self._inode = None
+        self._last_validated = time.monotonic()
+
+    def _revalidate(self, force=False, locked=False):
+        now = time.monotonic()
+        if not force and now - self._last_validated < REVALIDATE_INTERVAL_SEC:
+            return
+        self._last_validated = now
+        try:
+            st = os.stat(self.journal_path)
+        except FileNotFoundError:
+            if self._inode is not None:
+                self._reload(locked)
+            return
+        if st.st_ino != self._inode or st.st_size < self._offset:
+            # The journal was compacted by another worker.
+            self._reload(locked)
+        elif st.st_size > self._offset:
+            with open(self.journal_path, 'rb') as f:
+                if os.fstat(f.fileno()).st_ino != self._inode:
+                    # Compacted between the stat and the open.
+                    self._reload(locked)
+                    return
+                f.seek(self._offset)
+                self._read_journal(f)
+
+    def get(self, alias):
+        with self._lock:
+            self._revalidate()
+            return self._registry.get(alias)
+
+    def put(self, alias, entry):
+        record = json.dumps({"alias": alias, "entry": entry, "ts": time.time()}) + "\n"
+        with self._lock, self._file_lock():
+            self._revalidate(force=True, locked=True)
+            old_entry = self._registry.get(alias)
+            with open(self.journal_path, 'ab') as f:
+                f.write(record.encode())
+                f.flush()
+                os.fsync(f.fileno())
+                self._inode = os.fstat(f.fileno()).st_ino
+            self._offset += len(record.encode())
+            self._apply({"alias": alias, "entry": entry})
+            needs_compaction = self._offset > self._compact_threshold and not self._compacting
+            if needs_compaction:
+                self._compacting = True
+        if needs_compaction:
+            threading.Thread(target=self._compact_in_background, name="registry-compaction", daemon=True).start()
+        return old_entry
+
+    def all(self):
+        with self._lock:
+            self._revalidate()
+            return dict(self._registry)
+
+    def lineage(self, alias):
+        with self._lock:
+            self._revalidate()
+            return list(self._lineage.get(alias, []))
+
+    def replace_all(self, registry):
+        with self._lock, self._file_lock():
+            self._revalidate(force=True, locked=True)
+            for alias, entry in registry.items():
+                self._apply({"alias": alias, "entry": entry})
+            self._registry = dict(registry)
+            self._lineage = {alias: h for alias, h in self._lineage.items() if alias in self._registry}
+            self._write_snapshot()
+
+    @staticmethod
+    def _fsync_dir(directory):
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _write_snapshot(self):
+        # Snapshot first, then swap in an empty journal: replaying the old journal
+        # over the new snapshot after a crash in between is harmless. That only holds
+        # if the snapshot's data and its rename are on disk before the journal is
+        # emptied, hence the fsyncs of the file and then the directory.
+        directory = os.path.dirname(self.snapshot_path) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".model_registry.", suffix=".tmp")
+        with os.fdopen(fd, 'w') as f:
+            json.dump({"registry": self._registry, "lineage": self._lineage}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        self._fsync_dir(directory)
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".model_registry.", suffix=".log")
+        os.close(fd)
+        os.replace(tmp_path, self.journal_path)
+        self._fsync_dir(directory)
+        self._inode = os.stat(self.journal_path).st_ino
+        self._offset = 0
+
+    def compact(self):
+        with self._lock, self._file_lock():
+            self._revalidate(force=True, locked=True)
+            self._write_snapshot()
+
+    def _compact_in_background(self):
+        try:
+            self.compact()
+        except Exception as e:
+            print(f"Error compacting registry journal: {e}")
+        finally:
+            with self._lock:
+                self._compacting = False
+
+
+class KVRegistryBackend(RegistryBackend):
+    """Registry stored in a Redis hash behind the Vercel KV / Upstash REST API.
+
+    Commands are sent through the REST `/pipeline` endpoint so multi-alias reads and
+    read-modify-write updates cost one round trip. Reads go through a local cache
+    whose entries (including misses) live for KV_CACHE_TTL_SEC.
+    """
+
+    def __init__(self, url=None, token=None, hash_key=KV_HASH_KEY, cache_ttl=KV_CACHE_TTL_SEC, http_client=None):
+        import httpx
+
+        self.url = (url or os.environ.get("KV_REST_API_URL", "")).rstrip("/")
+        if not self.url:
+            raise ValueError("KV_REST_API_URL is required for the KV registry backend")
+        token = token if token is not None else os.environ.get("KV_REST_API_TOKEN", "")
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        self.hash_key = hash_key
+        self._cache_ttl = cache_ttl
+        self._client = http_client or httpx.Client(headers=headers, timeout=10)
+        self._lock = threading.Lock()
+        self._cache = {}
+
+    def pipeline(self, commands):
+        response = self._client.post(f"{self.url}/pipeline", json=commands)
+        response.raise_for_status()
+        results = []
+        for item in response.json():
+            if "error" in item:
+                raise RuntimeError(f"KV command failed: {item['error']}")
+            results.append(item.get("result"))
+        return results
+
+    def _cached(self, alias, now):
+        hit = self._cache.get(alias)
+        if hit is None or hit[1] < now:
+            return False, None
+        return True, hit[0]
+
+    def _remember(self, alias, entry, now):
+        self._cache[alias] = (entry, now + self._cache_ttl)
+
+    @staticmethod
+    def _decode(raw):
+        return json.loads(raw) if raw is not None else None
+
+    def get(self, alias):
+        return self.get_many([alias])[alias]
+
+    def get_many(self, aliases):
+        now = time.monotonic()
+        found, missing = {}, []
+        with self._lock:
+            for alias in aliases:
+                hit, entry = self._cached(alias, now)
+                if hit:
+                    found[alias] = entry
+                else:
+                    missing.append(alias)
+        if missing:
+            (raw_values,) = self.pipeline([["HMGET", self.hash_key, *missing]])
+            with self._lock:
+                for alias, raw in zip(missing, raw_values):
+                    found[alias] = self._decode(raw)
+                    self._remember(alias, found[alias], now)
+        return found
+
+    def put(self, alias, entry):
+        old_raw, _ = self.pipeline([
+            ["HGET", self.hash_key, alias],
+            ["HSET", self.hash_key, alias, json.dumps(entry)],
+        ])
+        with self._lock:
+            self._remember(alias, entry, time.monotonic())
+        return self._decode(old_raw)
+
+    def all(self):
+        (flat,) = self.pipeline([["HGETALL", self.hash_key]])
+        flat = flat or []
+        registry = {flat[i]: self._decode(flat[i + 1]) for i in range(0, len(flat), 2)}
+        now = time.monotonic()
+        with self._lock:
+            for alias, entry in registry.items():
+                self._remember(alias, entry, now)
+        return registry
+
+    def replace_all(self, registry):
+        commands = [["DEL", self.hash_key]]
+        if registry:
+            fields = []
+            for alias, entry in registry.items():
+                fields.extend([alias, json.dumps(entry)])
+            commands.append(["HSET", self.hash_key, *fields])
+        self.pipeline(commands)
+        with self._lock:
+            self._cache.clear()
+
+
+def create_backend(name=None):
+    name = name or os.environ.get("REGISTRY_BACKEND")
+    if not name:
+        name = "kv" if os.environ.get("KV_REST_API_URL") else "journal"
+    if name == "kv":
+        return KVRegistryBackend()
+    if name == "memory":
+        return MemoryRegistryBackend()
+    if name == "journal":
+        return JournalRegistryBackend(os.environ.get("REGISTRY_JOURNAL", REGISTRY_JOURNAL))
+    if name == "file":
+        return FileRegistryBackend(os.environ.get("REGISTRY_FILE", REGISTRY_FILE))
+    raise ValueError(f"Unknown registry backend: {name}")
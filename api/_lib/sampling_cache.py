@@ -0,0 +1,222 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from api._lib.registry import add_update_listener
+from api._lib.client_manager import service_client_async
+from api._lib.loop_runner import submit
+from api._lib.tokenizer_cache import get_tokenizer_async
+from api._lib.completion_cache import get_completion_cache
+
+try:
+    from api._tinker import types
+except Exception:
+    try:
+        from tinker import types
+    except Exception:
+        types = None
+
+# Live SamplingClients keyed by resolved model id (a tinker:// path or a base model
+# name). Creating one costs a sampling-session round trip, so repeated chats against
+# the same alias reuse the session until it sits idle for IDLE_TIMEOUT_SEC, is pushed
+# out by MAX_ENTRIES, or its alias moves to a new checkpoint.
+#
+# A feedback round can also hand an alias an ephemeral SamplingClient over its
+# freshly trained weights before the durable checkpoint exists; chats resolving the
+# alias to the checkpoint it was trained from are served by that client instead.
+#
+# When an alias moves to a checkpoint with no live session, the new session is
+# created (and optionally warmed with a one-token sample) in the background. If the
+# old checkpoint still has a live session, the alias keeps being served by it through
+# the same handoff and the swap happens once the new session is ready.
+
+IDLE_TIMEOUT_SEC = int(os.environ.get("SAMPLING_CLIENT_IDLE_TIMEOUT", "600"))
+MAX_ENTRIES = int(os.environ.get("SAMPLING_CLIENT_CACHE_SIZE", "32"))
+PREWARM = os.environ.get("SAMPLING_PREWARM", "1") != "0"
+PREWARM_SAMPLE = os.environ.get("SAMPLING_PREWARM_SAMPLE", "1") != "0"
+
+
+class _SamplingEntry:
+    def __init__(self, client, holder):
+        self.client = client
+        self.holder = holder
+        self.last_used = time.monotonic()
+
+
+class _Handoff:
+    def __init__(self, from_id, model_id, client, holder):
+        self.from_id = from_id
+        self.model_id = model_id
+        self.client = client
+        self.holder = holder
+
+
+class SamplingClientCache:
+    def __init__(self, max_entries=MAX_ENTRIES, idle_timeout=IDLE_TIMEOUT_SEC):
+        self._max_entries = max_entries
+        self._idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._handoffs = {}
+        self.hits = 0
+        self.handoff_hits = 0
+        self.misses = 0
+
+    def _evict_idle(self, now):
+        expired = [k for k, e in self._entries.items() if now - e.last_used > self._idle_timeout]
+        for key in expired:
+            del self._entries[key]
+
+    def get(self, model_id, holder):
+        with self._lock:
+            now = time.monotonic()
+            self._evict_idle(now)
+            entry = self._entries.get(model_id)
+            # A client created under a previous service session cannot be reused.
+            if entry is None or entry.holder is not holder:
+                self._entries.pop(model_id, None)
+                self.misses += 1
+                return None
+            entry.last_used = now
+            self._entries.move_to_end(model_id)
+            self.hits += 1
+            return entry.client
+
+    def put(self, model_id, client, holder):
+        with self._lock:
+            existing = self._entries.get(model_id)
+            if existing is not None and existing.holder is holder:
+                # Another request created one concurrently; keep the first.
+                existing.last_used = time.monotonic()
+                return existing.client
+            self._entries[model_id] = _SamplingEntry(client, holder)
+            self._entries.move_to_end(model_id)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+            return client
+
+    def peek(self, model_id):
+        """Returns (client, holder) for model_id without touching recency or stats."""
+        with self._lock:
+            entry = self._entries.get(model_id)
+            return (entry.client, entry.holder) if entry is not None else None
+
+    def hand_off(self, alias, from_id, model_id, client, holder):
+        """Serves alias from client, under model_id, while the registry still points it at from_id."""
+        with self._lock:
+            self._handoffs[alias] = _Handoff(from_id, model_id, client, holder)
+
+    def get_handoff(self, alias, resolved_id, holder):
+        """Returns (model_id, client) handed off for alias, or None once the registry has moved on."""
+        with self._lock:
+            handoff = self._handoffs.get(alias)
+            if handoff is None or handoff.from_id != resolved_id or handoff.holder is not holder:
+                return None
+            self.handoff_hits += 1
+            return handoff.model_id, handoff.client
+
+    def clear_handoff(self, alias, model_id=None):
+        with self._lock:
+            handoff = self._handoffs.get(alias)
+            if handoff is not None and (model_id is None or handoff.model_id == model_id):
+                del self._handoffs[alias]
+
+    def invalidate(self, model_id):
+        with self._lock:
+            self._entries.pop(model_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "handoffs": len(self._handoffs),
+                "hits": self.hits,
+                "handoff_hits": self.handoff_hits,
+                "misses": self.misses,
+            }
+
+
+_cache = SamplingClientCache()
+
+
+def get_sampling_cache():
+    return _cache
+
+
+async def get_sampling_client(sc, model_id: str):
+    """Returns a cached SamplingClient for model_id, creating the session on a miss."""
+    client = _cache.get(model_id, sc.holder)
+    if client is not None:
+        return client
+
+    if model_id.startswith("tinker://"):
+        client = await sc.create_sampling_client_async(model_path=model_id)
+    else:
+        client = await sc.create_sampling_client_async(base_model=model_id)
+    return _cache.put(model_id, client, sc.holder)
+
+
+async def get_alias_sampling_client(sc, alias, model_id):
+    """Returns (model_id, client) for a resolved alias, preferring a feedback handoff.
+
+    The returned model_id is the one to key caches by, since a handed-off client
+    serves weights that differ from the resolved checkpoint's.
+    """
+    handoff = _cache.get_handoff(alias, model_id, sc.holder)
+    if handoff is not None:
+        return handoff
+    return model_id, await get_sampling_client(sc, model_id)
+
+
+async def _warm_up(client, base_model):
+    tokenizer = await get_tokenizer_async(base_model)
+    tokens = tokenizer.encode("Hello", add_special_tokens=False).ids
+    params = types.SamplingParams(max_tokens=1, temperature=0)
+    future = await client.sample_async(prompt=types.ModelInput.from_ints(tokens=tokens), sampling_params=params, num_samples=1)
+    if hasattr(future, 'result_async'):
+        await future.result_async()
+
+
+async def _prewarm(alias, base_model, old_id, new_id):
+    """Creates the session for new_id, then ends the handoff that kept alias on old_id."""
+    try:
+        async with service_client_async() as sc:
+            client = await sc.create_sampling_client_async(model_path=new_id)
+            if PREWARM_SAMPLE and base_model:
+                try:
+                    await _warm_up(client, base_model)
+                except Exception as e:
+                    print(f"Error warming sampling session for {new_id}: {e}")
+            _cache.put(new_id, client, sc.holder)
+    except Exception as e:
+        print(f"Error pre-warming sampling session for {new_id}: {e}")
+    finally:
+        _cache.clear_handoff(alias, old_id)
+        if old_id.startswith("tinker://"):
+            await get_completion_cache().invalidate_model_async(old_id)
+
+
+def _on_model_entry_updated(alias, old_entry, new_entry):
+    if not old_entry:
+        return
+    old_id = old_entry.get("currentModelId")
+    new_id = new_entry.get("currentModelId")
+    if not old_id or old_id == new_id:
+        return
+
+    old_session = _cache.peek(old_id)
+    if old_id.startswith("tinker://"):
+        _cache.invalidate(old_id)
+
+    if PREWARM and new_id and new_id.startswith("tinker://") and _cache.peek(new_id) is None:
+        if old_session is not None:
+            # Chats resolving alias to new_id keep sampling from old_id until its session is ready.
+            _cache.hand_off(alias, new_id, old_id, *old_session)
+        submit(_prewarm(alias, new_entry.get("baseModel"), old_id, new_id))
+
+
+add_update_listener(_on_model_entry_updated)
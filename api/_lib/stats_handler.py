@@ -0,0 +1,42 @@
+from api._lib.http_utils import empty_response, error_response, json_response
+from api._lib.loop_runner import get_handler_loop
+from api._lib.inflight import get_sample_flight
+from api._lib.client_manager import get_client_manager
+from api._lib.capability_cache import get_capability_cache
+from api._lib.tokenizer_cache import get_tokenizer_cache
+from api._lib.sampling_cache import get_sampling_cache
+from api._lib.completion_cache import get_completion_cache
+from api._lib.conversation_store import get_conversation_store
+from api._lib.training_pool import get_training_pool
+from api._lib.feedback_batcher import get_feedback_accumulator
+from api._lib.feedback_handler import get_feedback_jobs
+
+# Counters of the shared caches, pools and handler loop in this process, e.g. to
+# see how many sample calls were coalesced or how far behind the loop is running.
+
+
+def collect_stats():
+    from api._lib.asgi import app
+    return {
+        "http": {"in_flight": app.in_flight, "rejected": app.rejected},
+        "handler_loop": get_handler_loop().metrics(),
+        "sample_flight": get_sample_flight().stats(),
+        "service_client": get_client_manager().stats(),
+        "capabilities": get_capability_cache().stats(),
+        "tokenizers": get_tokenizer_cache().stats(),
+        "sampling_clients": get_sampling_cache().stats(),
+        "completions": get_completion_cache().stats(),
+        "conversations": get_conversation_store().stats(),
+        "training_clients": get_training_pool().stats(),
+        "feedback_rounds": get_feedback_accumulator().stats(),
+        "feedback_jobs": get_feedback_jobs().stats(),
+    }
+
+
+async def handle_stats(request):
+    if request.method not in ("GET", "HEAD"):
+        return empty_response(405)
+    try:
+        return json_response(collect_stats(), headers={'Cache-Control': 'no-store'})
+    except Exception as e:
+        return error_response(e)
@@ -0,0 +1,85 @@
+# Stop sets for chat sampling. Without them the model keeps writing invented
+# User/Assistant turns until max_tokens, so generation is cut at the template's
+# end-of-turn token (or the tokenizer's EOS) and the output trimmed at that boundary.
+
+EOS_TOKENS = ("<|endoftext|>", "<|end_of_text|>", "</s>")
+
+
+def build_stop(template, tokenizer):
+    """Returns token ids for templates with end-of-turn tokens, else stop strings."""
+    if template.end_of_turn:
+        stop_ids = []
+        for token in (*template.end_of_turn, *EOS_TOKENS):
+            token_id = tokenizer.token_to_id(token)
+            if token_id is not None and token_id not in stop_ids:
+                stop_ids.append(token_id)
+        if stop_ids:
+            return stop_ids
+    # SamplingParams.stop takes either strings or ids, so EOS is matched by its text here.
+    stop_strings = list(template.stop_strings)
+    for token in EOS_TOKENS:
+        if tokenizer.token_to_id(token) is not None:
+            stop_strings.append(token)
+    return stop_strings or None
+
+
+def _find_stop_string(text, stop_strings):
+    positions = [text.find(s) for s in stop_strings]
+    positions = [p for p in positions if p >= 0]
+    return min(positions) if positions else None
+
+
+def trim_at_stop(tokens, logprobs, stop, tokenizer):
+    """Cuts generated output at the first stop boundary.
+
+    Returns (text, tokens, logprobs, stopped) with the stop sequence itself removed.
+    """
+    def decode(ids):
+        return tokenizer.decode(ids, skip_special_tokens=True)
+
+    if not stop or not tokens:
+        return decode(tokens), tokens, logprobs, False
+
+    if isinstance(stop[0], int):
+        stop_ids = set(stop)
+        for i, token in enumerate(tokens):
+            if token in stop_ids:
+                kept = tokens[:i]
+                return decode(kept), kept, logprobs[:i] if logprobs is not None else None, True
+        return decode(tokens), tokens, logprobs, False
+
+    text = decode(tokens)
+    cut = _find_stop_string(text, stop)
+    if cut is None:
+        return text, tokens, logprobs, False
+
+    kept = token_prefix_length(tokens, cut, tokenizer)
+    return text[:cut], tokens[:kept], logprobs[:kept] if logprobs is not None else None, True
+
+
+def token_prefix_length(tokens, length, tokenizer, lo=0):
+    """Largest token prefix whose decoded text is at most length characters.
+
+    lo is a prefix length already known to fit.
+    """
+    hi = len(tokens)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if len(tokenizer.decode(tokens[:mid], skip_special_tokens=True)) <= length:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def emittable_length(text, stop):
+    """Length of text that is safe to stream: a tail that could start a stop string is held back."""
+    if not stop or isinstance(stop[0], int):
+        return len(text)
+    held = 0
+    for s in stop:
+        for n in range(min(len(s) - 1, len(text)), held, -1):
+            if text.endswith(s[:n]):
+                held = n
+                break
+    return len(text) - held
@@ -0,0 +1,206 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Shared tokenizer registry. Tokenizer.from_pretrained can hit the network once per
+# fallback, so loaded tokenizers are kept in a bounded LRU keyed by the name they
+# were loaded from, the name that worked is remembered per base model and failed
+# names are not retried until FAILURE_TTL_SEC has passed. Models of one family
+# share a tokenizer, so they load it from one repo and share one instance.
+
+MAX_TOKENIZERS = int(os.environ.get("TOKENIZER_CACHE_SIZE", "8"))
+FAILURE_TTL_SEC = 300
+DEFAULT_FALLBACK = "gpt2"
+
+SHARED_TOKENIZERS = {
+    "Qwen3": "Qwen/Qwen3-8B",
+    "Llama-3": "meta-llama/Llama-3.1-8B",
+}
+
+
+def tokenizer_name(model_name: str):
+    """The repo model_name's tokenizer is loaded from first."""
+    for family, name in SHARED_TOKENIZERS.items():
+        if family in model_name:
+            return name
+    return model_name
+
+
+def fallback_chain(model_name: str):
+    if "Qwen3" in model_name:
+        fallback = "Qwen/Qwen2.5-1.5B-Instruct"
+    elif "Llama-3" in model_name:
+        fallback = DEFAULT_FALLBACK
+    else:
+        fallback = model_name
+
+    chain = []
+    for name in (tokenizer_name(model_name), fallback, DEFAULT_FALLBACK):
+        if name not in chain:
+            chain.append(name)
+    return chain
+
+
+class TokenizerCache:
+    def __init__(self, max_size=MAX_TOKENIZERS, failure_ttl=FAILURE_TTL_SEC, loader=None):
+        self._max_size = max_size
+        self._failure_ttl = failure_ttl
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._tokenizers = OrderedDict()
+        self._resolved = {}
+        self._failures = {}
+        self._load_locks = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self, name):
+        if self._loader is not None:
+            return self._loader(name)
+        from tokenizers import Tokenizer
+        return Tokenizer.from_pretrained(name)
+
+    def _failed_recently(self, name):
+        failed_at = self._failures.get(name)
+        if failed_at is None:
+            return False
+        if time.monotonic() - failed_at > self._failure_ttl:
+            del self._failures[name]
+            return False
+        return True
+
+    def _lookup(self, model_name):
+        name = self._resolved.get(model_name)
+        if name is None:
+            return None
+        return self._cached(name)
+
+    def _cached(self, name):
+        tokenizer = self._tokenizers.get(name)
+        if tokenizer is not None:
+            self._tokenizers.move_to_end(name)
+        return tokenizer
+
+    def _store(self, name, tokenizer):
+        self._tokenizers[name] = tokenizer
+        self._tokenizers.move_to_end(name)
+        while len(self._tokenizers) > self._max_size:
+            self._tokenizers.popitem(last=False)
+
+    def get(self, model_name: str):
+        with self._lock:
+            tokenizer = self._lookup(model_name)
+            if tokenizer is not None:
+                self.hits += 1
+                return tokenizer
+            self.misses += 1
+            load_lock = self._load_locks.setdefault(tokenizer_name(model_name), threading.Lock())
+
+        # Only one thread loads a given tokenizer; the others wait and reuse its result.
+        with load_lock:
+            with self._lock:
+                tokenizer = self._lookup(model_name)
+                if tokenizer is not None:
+                    return tokenizer
+                resolved = self._resolved.get(model_name)
+                candidates = [resolved] if resolved else fallback_chain(model_name)
+                candidates = [c for c in candidates if not self._failed_recently(c)]
+
+            last_error = None
+            for name in candidates:
+                with self._lock:
+                    # Already loaded for another model of the same family.
+                    tokenizer = self._cached(name)
+                    if tokenizer is not None:
+                        self._resolved[model_name] = name
+                        return tokenizer
+                try:
+                    tokenizer = self._load(name)
+                except Exception as e:
+                    last_error = e
+                    with self._lock:
+                        self._failures[name] = time.monotonic()
+                        self._resolved.pop(model_name, None)
+                    continue
+                with self._lock:
+                    self._resolved[model_name] = name
+                    self._store(name, tokenizer)
+                return tokenizer
+
+        if last_error is None:
+            raise RuntimeError(f"No tokenizer available for {model_name} (recent load failures cached)")
+        raise last_error
+
+    def peek(self, model_name: str):
+        """Returns the cached tokenizer for model_name without loading it."""
+        with self._lock:
+            tokenizer = self._lookup(model_name)
+            if tokenizer is not None:
+                self.hits += 1
+            return tokenizer
+
+    def resolved_name(self, model_name: str):
+        with self._lock:
+            return self._resolved.get(model_name)
+
+    def preload(self, model_names):
+        """Loads tokenizers for model_names on a daemon thread and returns the thread.
+
+        Only as many distinct tokenizers as the cache holds are loaded; models
+        sharing one of those are mapped to it without another load.
+        """
+        names = []
+        for model_name in model_names:
+            if tokenizer_name(model_name) not in names:
+                names.append(tokenizer_name(model_name))
+        names = names[:self._max_size]
+        model_names = [m for m in model_names if tokenizer_name(m) in names]
+
+        def _run():
+            for name in model_names:
+                try:
+                    self.get(name)
+                except Exception as e:
+                    print(f"Error preloading tokenizer for {name}: {e}")
+
+        thread = threading.Thread(target=_run, name="tokenizer-preload", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._tokenizers),
+                "models": len(self._resolved),
+                "hits": self.hits,
+                "misses": self.misses,
+                "failed_names": len(self._failures),
+            }
+
+
+_cache = TokenizerCache()
+
+
+def get_tokenizer_cache():
+    return _cache
+
+
+def get_tokenizer(model_name: str):
+    return _cache.get(model_name)
+
+
+async def get_tokenizer_async(model_name: str):
+    """get_tokenizer for coroutines: a cold load (possibly a download) runs in a worker thread."""
+    tokenizer = _cache.peek(model_name)
+    if tokenizer is not None:
+        return tokenizer
+    return await asyncio.to_thread(_cache.get, model_name)
+
+
+def preload_tokenizers(model_names=None):
+    if model_names is None:
+        from api._lib.models_handler import FALLBACK_MODELS
+        model_names = FALLBACK_MODELS
+    return _cache.preload(model_names)
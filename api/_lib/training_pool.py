@@ -0,0 +1,111 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+
+# Warm pool of LoRA TrainingClients keyed by alias. Creating a training client and
+# loading a checkpoint into it costs a model creation plus a full weight load, so a
+# pooled client is kept with the weights it last trained or loaded, and load_state
+# is skipped when those are already the alias's currentModelId. Clients are dropped
+# after TRAINING_CLIENT_IDLE_TIMEOUT seconds idle or once the pool exceeds MAX_CLIENTS.
+#
+# Leases are serialized per alias with an asyncio.Lock; all feedback coroutines run
+# on the shared handler loop.
+
+IDLE_TIMEOUT_SEC = int(os.environ.get("TRAINING_CLIENT_IDLE_TIMEOUT", "900"))
+MAX_CLIENTS = int(os.environ.get("TRAINING_POOL_SIZE", "8"))
+LORA_RANK = 32
+
+
+class PooledTrainingClient:
+    def __init__(self, alias):
+        self.alias = alias
+        self.client = None
+        self.holder = None
+        self.base_model = None
+        # Checkpoint path (or base model name) whose weights the client currently holds.
+        self.loaded_path = None
+        self.last_used = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def reset(self):
+        self.client = None
+        self.holder = None
+        self.base_model = None
+        self.loaded_path = None
+
+
+class TrainingClientPool:
+    def __init__(self, idle_timeout=IDLE_TIMEOUT_SEC, max_clients=MAX_CLIENTS):
+        self._idle_timeout = idle_timeout
+        self._max_clients = max_clients
+        self._entries = {}
+        self.created = 0
+        self.loads = 0
+        self.reused = 0
+
+    def _evict(self, now):
+        idle = [e for e in self._entries.values() if not e.lock.locked()]
+        for entry in idle:
+            if now - entry.last_used > self._idle_timeout:
+                del self._entries[entry.alias]
+        idle = sorted((e for e in self._entries.values() if not e.lock.locked()), key=lambda e: e.last_used)
+        while len(self._entries) > self._max_clients and idle:
+            del self._entries[idle.pop(0).alias]
+
+    def _entry(self, alias):
+        self._evict(time.monotonic())
+        entry = self._entries.get(alias)
+        if entry is None:
+            entry = PooledTrainingClient(alias)
+            self._entries[alias] = entry
+        return entry
+
+    async def _prepare(self, sc, entry, base_model, current_model_id):
+        if entry.client is None or entry.holder is not sc.holder or entry.base_model != base_model:
+            entry.reset()
+            entry.client = await sc.create_lora_training_client_async(base_model=base_model, rank=LORA_RANK)
+            entry.holder = sc.holder
+            entry.base_model = base_model
+            entry.loaded_path = base_model
+            self.created += 1
+
+        if entry.loaded_path == current_model_id:
+            self.reused += 1
+            return
+
+        if current_model_id.startswith("tinker://"):
+            # A failed load must not fall through to training on whatever weights the
+            # client held before; lease() drops the client and the caller retries.
+            lf = await entry.client.load_state_async(current_model_id)
+            if hasattr(lf, 'result_async'): await lf.result_async()
+            entry.loaded_path = current_model_id
+            self.loads += 1
+
+    @asynccontextmanager
+    async def lease(self, sc, alias, base_model, current_model_id):
+        """Yields a PooledTrainingClient holding current_model_id's weights.
+
+        The caller sets entry.loaded_path to the checkpoint it saves. If the block
+        raises, the client's weights are unknown and it is dropped from the pool.
+        """
+        entry = self._entry(alias)
+        async with entry.lock:
+            try:
+                await self._prepare(sc, entry, base_model, current_model_id)
+                yield entry
+            except BaseException:
+                entry.reset()
+                raise
+            finally:
+                entry.last_used = time.monotonic()
+
+    def stats(self):
+        return {"clients": len(self._entries), "created": self.created, "loads": self.loads, "reused": self.reused}
+
+
+_pool = TrainingClientPool()
+
+
+def get_training_pool():
+    return _pool
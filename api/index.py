@@ -1,18 +1,35 @@
+import os
 from http.server import BaseHTTPRequestHandler
-from urllib.parse import urlparse
-from api._lib.models_handler import handle_models
-from api._lib.chat_handler import handle_chat
-from api._lib.feedback_handler import handle_feedback
+from api._lib.asgi import app, dispatch
+from api._lib.http_utils import read_request, write_response
+from api._lib.loop_runner import run_async, submit
+from api._lib.feedback_handler import get_feedback_jobs
+from api._lib.tokenizer_cache import preload_tokenizers
+
+# Warm the tokenizer cache in the background so the first chat turn doesn't pay for it.
+if os.environ.get("TOKENIZER_PRELOAD", "1") != "0":
+    preload_tokenizers()
+
+# Resume feedback jobs left queued or interrupted by a previous process (a no-op
+# with FEEDBACK_WORKER=0).
+submit(get_feedback_jobs().resume())
 
 class handler(BaseHTTPRequestHandler):
+    # Compatibility shim for runtimes that expect a BaseHTTPRequestHandler; `app` is
+    # the native ASGI entry point. Every response carries Content-Length, so
+    # connections can be kept alive between requests.
+    protocol_version = "HTTP/1.1"
+
     def do_GET(self):
         self.route()
 
     def do_POST(self):
         self.route()
 
+    def do_HEAD(self):
+        self.route()
+
     def route(self):
-        parsed = urlparse(self.path)
         # Vercel passes the path as is. Next.js rewrites will map /api/chat/completions to /api?path=... if configured or just pass path.
         # But since I will rewrite /api/:path* -> /api/index in next.config.js, I need to check the path.
 
@@ -20,12 +37,6 @@ class handler(BaseHTTPRequestHandler):
         # If I call /api/models, path is /api/models
         # If I call /api/chat/completions, path is /api/chat/completions
 
-        if parsed.path.endswith("/api/models"):
-            handle_models(self)
-        elif parsed.path.endswith("/api/chat/completions"):
-            handle_chat(self)
-        elif parsed.path.endswith("/api/feedback"):
-            handle_feedback(self)
-        else:
-            self.send_response(404)
-            self.end_headers()
+        request = read_request(self)
+        response = run_async(dispatch(request))
+        write_response(self, response)
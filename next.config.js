@@ -5,14 +5,26 @@ module.exports = {
         source: '/api/chat/completions',
         destination: '/api',
       },
+      {
+        source: '/api/chat/batch',
+        destination: '/api',
+      },
       {
         source: '/api/feedback',
         destination: '/api',
       },
+      {
+        source: '/api/feedback/status',
+        destination: '/api',
+      },
       {
         source: '/api/models',
         destination: '/api',
       },
+      {
+        source: '/api/stats',
+        destination: '/api',
+      },
     ]
   },
 }
@@ -115,6 +115,8 @@ export default function Home() {
         body: JSON.stringify({
           model_alias: msg.metadata.modelAlias,
           prompt: userMsg.content,
+          // The conversation the response was sampled from, so training sees the same context
+          messages: messages.slice(0, index).map(({ role, content }) => ({ role, content })),
           generated_output: msg.content,
           feedback_type: type,
           correct_output: correction,
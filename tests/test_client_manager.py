@@ -0,0 +1,73 @@
+import time
+import types as pytypes
+
+from api._lib.client_manager import ServiceClientManager
+
+
+def _make_manager(probe_results, max_failed_probes=2):
+    created = []
+    probes = []
+
+    def factory():
+        client = pytypes.SimpleNamespace(holder=pytypes.SimpleNamespace(close=lambda: None))
+        created.append(client)
+        return client
+
+    def probe(client):
+        probes.append(client)
+        if not probe_results.pop(0):
+            raise ConnectionError("session gone")
+
+    manager = ServiceClientManager(factory=factory, health_check_interval=0, probe=probe,
+                                   max_failed_probes=max_failed_probes)
+    return manager, created, probes
+
+
+def _use(manager):
+    client = manager.acquire()
+    manager.release(client)
+    return client
+
+
+def _wait_for_probes(manager, count, probes):
+    deadline = time.monotonic() + 2
+    while time.monotonic() < deadline:
+        with manager._lock:
+            idle = not any(e.probing for e in manager._entries.values())
+        if len(probes) >= count and idle:
+            return
+        time.sleep(0.01)
+    raise AssertionError("probe did not run")
+
+
+def test_healthy_probes_keep_the_client():
+    manager, created, probes = _make_manager([True, True])
+    first = _use(manager)
+    for count in (1, 2):
+        time.sleep(0.001)
+        assert _use(manager) is first
+        _wait_for_probes(manager, count, probes)
+    assert len(created) == 1
+
+
+def test_client_is_replaced_only_after_consecutive_failed_probes():
+    manager, created, probes = _make_manager([False, False])
+    first = _use(manager)
+
+    assert _use(manager) is first
+    _wait_for_probes(manager, 1, probes)
+    # One failed heartbeat is not enough to drop every session built on the client.
+    assert _use(manager) is first
+    _wait_for_probes(manager, 2, probes)
+
+    assert _use(manager) is not first
+    assert len(created) == 2
+
+
+def test_connection_error_probes_instead_of_retiring():
+    manager, created, probes = _make_manager([True])
+    client = manager.acquire()
+    manager.suspect(client)
+    manager.release(client)
+    _wait_for_probes(manager, 1, probes)
+    assert manager.stats()["generation"] == 1
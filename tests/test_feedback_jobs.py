@@ -0,0 +1,106 @@
+import asyncio
+import os
+
+from api._lib.feedback_jobs import FeedbackJobQueue
+
+
+async def _drain(queue, *job_ids, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while asyncio.get_running_loop().time() < deadline:
+        jobs = [await queue.get_async(job_id) for job_id in job_ids]
+        if all(job["status"] not in ("queued", "running") for job in jobs):
+            return jobs
+        await asyncio.sleep(0.01)
+    return jobs
+
+
+def test_finished_jobs_leave_the_pending_directory(tmp_path):
+    async def runner(data, on_stage):
+        await on_stage("training")
+        return "base", "tinker://new"
+
+    async def run():
+        queue = FeedbackJobQueue(runner, directory=str(tmp_path))
+        job = await queue.enqueue({"model_alias": "a"})
+        return (await _drain(queue, job["id"]))[0]
+
+    job = asyncio.run(run())
+    assert job["status"] == "succeeded"
+    assert job["new_model_id"] == "tinker://new"
+    assert [n for n in os.listdir(tmp_path) if n.endswith(".json")] == []
+    assert os.listdir(tmp_path / "done") == [job["id"] + ".json"]
+
+
+def test_permanent_errors_fail_without_retry(tmp_path):
+    calls = []
+
+    async def runner(data, on_stage):
+        calls.append(data["kind"])
+        if data["kind"] == "import":
+            raise ImportError("Tinker library not available")
+        return {"error": "Model alias required"}
+
+    async def run():
+        queue = FeedbackJobQueue(runner, directory=str(tmp_path), max_attempts=3)
+        first = await queue.enqueue({"kind": "import"})
+        second = await queue.enqueue({"kind": "dict"})
+        return await _drain(queue, first["id"], second["id"])
+
+    first, second = asyncio.run(run())
+    assert (first["status"], first["attempts"]) == ("failed", 1)
+    assert (second["status"], second["attempts"]) == ("failed", 1)
+    assert second["error"] == "Model alias required"
+    assert sorted(calls) == ["dict", "import"]
+
+
+def test_transient_errors_are_requeued(tmp_path):
+    async def runner(data, on_stage):
+        raise ConnectionError("temporarily unavailable")
+
+    async def run():
+        queue = FeedbackJobQueue(runner, directory=str(tmp_path), max_attempts=3)
+        job = await queue.enqueue({})
+        await asyncio.sleep(0.1)
+        return await queue.get_async(job["id"])
+
+    job = asyncio.run(run())
+    assert job["status"] == "queued"
+    assert job["attempts"] == 1
+    assert job["retry_at"] > job["updated_at"]
+
+
+def test_recover_requeues_jobs_of_dead_workers(tmp_path):
+    async def runner(data, on_stage):
+        return "base", "tinker://new"
+
+    queue = FeedbackJobQueue(runner, directory=str(tmp_path))
+    job = {"id": "1-00000000", "status": "running", "attempts": 1, "data": {}}
+    queue._write(dict(job))
+    with open(tmp_path / "1-00000000.lock", "w") as f:
+        f.write("999999999")
+    finished = {"id": "2-00000000", "status": "succeeded", "attempts": 1, "data": {}}
+    queue._write(dict(finished), finished=True)
+    queue._write(dict(finished, status="running"))
+
+    queue._recover()
+
+    assert queue.get("1-00000000")["status"] == "queued"
+    assert not os.path.exists(tmp_path / "1-00000000.lock")
+    assert not os.path.exists(tmp_path / "2-00000000.json")
+    assert queue.get("2-00000000")["status"] == "succeeded"
+
+
+def test_disabled_worker_only_queues(tmp_path):
+    async def runner(data, on_stage):
+        raise AssertionError("ran with the worker disabled")
+
+    async def run():
+        queue = FeedbackJobQueue(runner, directory=str(tmp_path), worker_enabled=False)
+        job = await queue.enqueue({"model_alias": "a"})
+        queue.start()
+        await asyncio.sleep(0.05)
+        return queue, await queue.get_async(job["id"])
+
+    queue, job = asyncio.run(run())
+    assert job["status"] == "queued"
+    assert queue._worker is None
@@ -0,0 +1,110 @@
+import asyncio
+import contextlib
+import types as pytypes
+
+import api._lib.feedback_batcher as feedback_batcher
+from api._lib.training_pool import TrainingClientPool
+
+
+class FakeTrainingClient:
+    def __init__(self, checkpoints, log):
+        self._checkpoints = checkpoints
+        self._log = log
+        self.weights = ()
+        self.pending = []
+
+    async def load_state_async(self, path):
+        self._log.append(("load", path))
+        self.weights = self._checkpoints[path]
+
+    async def forward_backward_async(self, data, loss_fn):
+        await asyncio.sleep(0.05)
+        self.pending.extend(data)
+
+    async def optim_step_async(self, params):
+        self.weights = self.weights + tuple(self.pending)
+        self.pending = []
+
+    async def save_weights_and_get_sampling_client_async(self):
+        raise RuntimeError("no sampler in tests")
+
+    def save_state(self, name):
+        path = f"tinker://v{len(self._checkpoints)}"
+        self._checkpoints[path] = self.weights
+        return pytypes.SimpleNamespace(path=path)
+
+
+class FakeServiceClient:
+    def __init__(self, checkpoints, log):
+        self.holder = object()
+        self._checkpoints = checkpoints
+        self._log = log
+
+    async def create_lora_training_client_async(self, base_model, rank):
+        self._log.append(("create", base_model))
+        return FakeTrainingClient(self._checkpoints, self._log)
+
+
+def _install_stubs(monkeypatch, registry, checkpoints, log):
+    sc = FakeServiceClient(checkpoints, log)
+
+    async def resolve(alias):
+        return registry[alias]
+
+    async def update(alias, base_model, model_id):
+        registry[alias] = (base_model, model_id)
+
+    @contextlib.asynccontextmanager
+    async def service_client_async():
+        yield sc
+
+    monkeypatch.setattr(feedback_batcher, "service_client_async", service_client_async)
+    monkeypatch.setattr(feedback_batcher, "resolve_model_alias", resolve)
+    monkeypatch.setattr(feedback_batcher, "update_model_entry_async", update)
+    monkeypatch.setattr(feedback_batcher, "types", pytypes.SimpleNamespace(AdamParams=lambda **kwargs: kwargs))
+    pool = TrainingClientPool()
+    monkeypatch.setattr(feedback_batcher, "get_training_pool", lambda: pool)
+
+
+def test_overlapping_rounds_build_on_each_other(monkeypatch):
+    registry = {"alias": ("base", "tinker://v0")}
+    checkpoints = {"tinker://v0": ("seed",)}
+    log = []
+    _install_stubs(monkeypatch, registry, checkpoints, log)
+    accumulator = feedback_batcher.FeedbackAccumulator(window=0, max_size=1)
+
+    async def run():
+        first = asyncio.ensure_future(accumulator.submit("alias", "base", [("r1", "cross_entropy")]))
+        # Let the first round flush and start training before the second is queued.
+        await asyncio.sleep(0.01)
+        second = asyncio.ensure_future(accumulator.submit("alias", "base", [("r2", "cross_entropy")]))
+        return await asyncio.gather(first, second)
+
+    (_, first_id), (_, second_id) = asyncio.run(run())
+
+    assert first_id == "tinker://v1"
+    assert second_id == "tinker://v2"
+    assert registry["alias"] == ("base", "tinker://v2")
+    assert checkpoints["tinker://v2"] == ("seed", "r1", "r2")
+    # The pooled client already held v1 when the second round started.
+    assert [entry for entry in log if entry[0] == "load"] == [("load", "tinker://v0")]
+    assert accumulator.rounds == 2
+
+
+def test_events_within_window_share_a_round(monkeypatch):
+    registry = {"alias": ("base", "tinker://v0")}
+    checkpoints = {"tinker://v0": ()}
+    log = []
+    _install_stubs(monkeypatch, registry, checkpoints, log)
+    accumulator = feedback_batcher.FeedbackAccumulator(window=0.05, max_size=100)
+
+    async def run():
+        return await asyncio.gather(*(
+            accumulator.submit("alias", "base", [(f"e{i}", "cross_entropy")]) for i in range(4)
+        ))
+
+    results = asyncio.run(run())
+
+    assert {model_id for _, model_id in results} == {"tinker://v1"}
+    assert checkpoints["tinker://v1"] == ("e0", "e1", "e2", "e3")
+    assert accumulator.rounds == 1
@@ -0,0 +1,36 @@
+import io
+
+from api._lib.http_utils import Response, empty_response, write_response
+
+
+class FakeRequestHandler:
+    def __init__(self, command="GET"):
+        self.command = command
+        self.status = None
+        self.headers = {}
+        self.wfile = io.BytesIO()
+
+    def send_response(self, status):
+        self.status = status
+
+    def send_header(self, name, value):
+        self.headers[name] = value
+
+    def end_headers(self):
+        pass
+
+
+def test_not_modified_has_no_content_length():
+    for status in (204, 304):
+        handler = FakeRequestHandler()
+        write_response(handler, empty_response(status, {"ETag": '"abc"'}))
+        assert handler.status == status
+        assert "Content-Length" not in handler.headers
+        assert handler.wfile.getvalue() == b""
+
+
+def test_head_keeps_the_body_length():
+    handler = FakeRequestHandler("HEAD")
+    write_response(handler, Response(200, b"hello", {}))
+    assert handler.headers["Content-Length"] == "5"
+    assert handler.wfile.getvalue() == b""
@@ -0,0 +1,113 @@
+import json
+import os
+import threading
+import time
+
+import api._lib.registry_backends as registry_backends
+from api._lib.registry_backends import JournalRegistryBackend
+
+
+def _backend(tmp_path, **kwargs):
+    return JournalRegistryBackend(str(tmp_path / "registry.log"), **kwargs)
+
+
+def _entry(model_id):
+    return {"baseModel": "base", "currentModelId": model_id}
+
+
+def test_replays_snapshot_and_journal(tmp_path):
+    writer = _backend(tmp_path)
+    writer.put("a", _entry("v1"))
+    writer.compact()
+    writer.put("a", _entry("v2"))
+    writer.put("b", _entry("w1"))
+
+    reader = _backend(tmp_path)
+    assert reader.get("a") == _entry("v2")
+    assert reader.get("b") == _entry("w1")
+    assert reader.lineage("a") == [_entry("v1"), _entry("v2")]
+
+
+def test_reader_picks_up_appends_and_compaction(tmp_path):
+    writer = _backend(tmp_path)
+    reader = _backend(tmp_path)
+    writer.put("a", _entry("v1"))
+    reader._last_validated = 0
+    assert reader.get("a") == _entry("v1")
+
+    writer.compact()
+    writer.put("a", _entry("v2"))
+    reader._last_validated = 0
+    assert reader.get("a") == _entry("v2")
+
+
+def test_compaction_during_reload_is_not_missed(tmp_path, monkeypatch):
+    worker_a = _backend(tmp_path)
+    worker_a.put("m", _entry("old"))
+    worker_a.compact()
+    worker_a.put("m", _entry("v1"))
+    worker_b = _backend(tmp_path)
+
+    # Worker A writes and compacts while worker B is between reading the snapshot
+    # and reading the journal.
+    compactor = threading.Thread(target=lambda: (worker_a.put("m", _entry("v2")), worker_a.compact()))
+    real_load = json.load
+
+    def load_then_compact(f):
+        data = real_load(f)
+        if not compactor.is_alive() and compactor.ident is None:
+            compactor.start()
+            compactor.join(0.2)
+        return data
+
+    monkeypatch.setattr(registry_backends.json, "load", load_then_compact)
+    worker_b._reload()
+    monkeypatch.setattr(registry_backends.json, "load", real_load)
+    compactor.join(5)
+    assert not compactor.is_alive()
+
+    worker_b._last_validated = 0
+    assert worker_b.get("m") == _entry("v2")
+
+    worker_b.put("other", _entry("x"))
+    worker_b.compact()
+    fresh = _backend(tmp_path)
+    assert fresh.get("m") == _entry("v2")
+    assert fresh.get("other") == _entry("x")
+
+
+def test_compacts_past_threshold(tmp_path):
+    backend = _backend(tmp_path, compact_threshold=1)
+    backend.put("a", _entry("v1"))
+    deadline = time.monotonic() + 5
+    while backend._compacting and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert (tmp_path / "registry.log").stat().st_size == 0
+    assert _backend(tmp_path).get("a") == _entry("v1")
+
+
+def test_compaction_syncs_the_snapshot_before_emptying_the_journal(tmp_path, monkeypatch):
+    backend = _backend(tmp_path)
+    backend.put("a", _entry("v1"))
+
+    events = []
+    real_fsync, real_replace = os.fsync, os.replace
+
+    def fsync(fd):
+        events.append("fsync")
+        real_fsync(fd)
+
+    def replace(src, dst):
+        events.append(dst)
+        real_replace(src, dst)
+
+    monkeypatch.setattr(os, "fsync", fsync)
+    monkeypatch.setattr(os, "replace", replace)
+    backend.compact()
+
+    snapshot = events.index(backend.snapshot_path)
+    journal = events.index(backend.journal_path)
+    # The snapshot's data, then its rename, reach disk before the journal is emptied.
+    assert "fsync" in events[:snapshot]
+    assert "fsync" in events[snapshot + 1:journal]
+    assert _backend(tmp_path).get("a") == _entry("v1")
@@ -0,0 +1,81 @@
+import pytest
+
+pytest.importorskip("httpx")
+
+from api._lib.kv_standin import start_standin
+from api._lib.registry_backends import KVRegistryBackend
+
+
+@pytest.fixture
+def standin():
+    server, url = start_standin(token="secret")
+    yield url
+    server.shutdown()
+    server.server_close()
+
+
+def _entry(model_id):
+    return {"baseModel": "base", "currentModelId": model_id}
+
+
+def _counting(backend):
+    calls = []
+    pipeline = backend.pipeline
+
+    def counted(commands):
+        calls.append([c[0] for c in commands])
+        return pipeline(commands)
+
+    backend.pipeline = counted
+    return calls
+
+
+def test_put_returns_the_previous_entry(standin):
+    backend = KVRegistryBackend(standin, token="secret")
+    assert backend.put("a", _entry("v1")) is None
+    assert backend.put("a", _entry("v2")) == _entry("v1")
+    assert KVRegistryBackend(standin, token="secret").get("a") == _entry("v2")
+
+
+def test_get_many_is_one_round_trip_and_cached(standin):
+    writer = KVRegistryBackend(standin, token="secret")
+    writer.put("a", _entry("v1"))
+    writer.put("b", _entry("w1"))
+
+    reader = KVRegistryBackend(standin, token="secret", cache_ttl=60)
+    calls = _counting(reader)
+    assert reader.get_many(["a", "b", "missing"]) == {"a": _entry("v1"), "b": _entry("w1"), "missing": None}
+    assert reader.get_many(["a", "missing"]) == {"a": _entry("v1"), "missing": None}
+    assert calls == [["HMGET"]]
+
+
+def test_cache_entries_expire(standin):
+    writer = KVRegistryBackend(standin, token="secret")
+    reader = KVRegistryBackend(standin, token="secret", cache_ttl=0)
+    assert reader.get("a") is None
+    writer.put("a", _entry("v1"))
+    assert reader.get("a") == _entry("v1")
+
+
+def test_replace_all_swaps_the_whole_registry(standin):
+    backend = KVRegistryBackend(standin, token="secret", cache_ttl=60)
+    backend.put("a", _entry("v1"))
+    backend.replace_all({"b": _entry("w1")})
+    assert backend.get("a") is None
+    assert backend.all() == {"b": _entry("w1")}
+    backend.replace_all({})
+    assert backend.all() == {}
+
+
+def test_rejects_a_wrong_token(standin):
+    import httpx
+
+    backend = KVRegistryBackend(standin, token="wrong")
+    with pytest.raises(httpx.HTTPStatusError):
+        backend.get("a")
+
+
+def test_command_errors_raise(standin):
+    backend = KVRegistryBackend(standin, token="secret")
+    with pytest.raises(RuntimeError):
+        backend.pipeline([["NOSUCHCOMMAND"]])
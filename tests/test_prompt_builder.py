@@ -0,0 +1,22 @@
+from api._lib.models_handler import FALLBACK_MODELS
+from api._lib.prompt_builder import MODEL_TRAINING_TYPES, get_chat_template
+
+
+def test_every_lineup_model_has_a_training_type():
+    assert set(FALLBACK_MODELS) <= set(MODEL_TRAINING_TYPES)
+
+
+def test_templates_follow_the_lineup_training_types():
+    assert get_chat_template("meta-llama/Llama-3.3-70B").name == "llama3"
+    assert get_chat_template("meta-llama/Llama-3.1-8B-Instruct").name == "llama3"
+    assert get_chat_template("meta-llama/Llama-3.1-8B").name == "llama3-base"
+    assert get_chat_template("Qwen/Qwen3-4B-Instruct-2507").name == "qwen3"
+    assert get_chat_template("Qwen/Qwen3-8B-Base").name == "plain"
+    assert get_chat_template("some/unknown-model").name == "plain"
+
+
+def test_hybrid_models_start_with_thinking_closed():
+    for model in ("Qwen/Qwen3-8B", "Qwen/Qwen3-32B", "Qwen/Qwen3-30B-A3B"):
+        template = get_chat_template(model)
+        assert template.generation_prefix.endswith("<think>\n\n</think>\n\n")
+        assert template.end_of_turn == ("<|im_end|>",)
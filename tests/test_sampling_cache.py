@@ -0,0 +1,86 @@
+import asyncio
+import contextlib
+import types as pytypes
+
+import api._lib.sampling_cache as sampling_cache
+from api._lib.sampling_cache import SamplingClientCache, get_alias_sampling_client
+
+
+class FakeServiceClient:
+    def __init__(self):
+        self.holder = object()
+        self.created = []
+
+    async def create_sampling_client_async(self, model_path=None, base_model=None):
+        client = pytypes.SimpleNamespace(model=model_path or base_model)
+        self.created.append(client.model)
+        return client
+
+
+def _install_stubs(monkeypatch):
+    sc = FakeServiceClient()
+    cache = SamplingClientCache()
+    submitted = []
+
+    @contextlib.asynccontextmanager
+    async def service_client_async():
+        yield sc
+
+    async def invalidate_model_async(model_id):
+        pass
+
+    monkeypatch.setattr(sampling_cache, "_cache", cache)
+    monkeypatch.setattr(sampling_cache, "submit", submitted.append)
+    monkeypatch.setattr(sampling_cache, "service_client_async", service_client_async)
+    monkeypatch.setattr(sampling_cache, "PREWARM", True)
+    monkeypatch.setattr(sampling_cache, "PREWARM_SAMPLE", False)
+    monkeypatch.setattr(sampling_cache, "get_completion_cache",
+                        lambda: pytypes.SimpleNamespace(invalidate_model_async=invalidate_model_async))
+    return sc, cache, submitted
+
+
+def _update(alias, old_id, new_id):
+    sampling_cache._on_model_entry_updated(
+        alias, {"baseModel": "base", "currentModelId": old_id}, {"baseModel": "base", "currentModelId": new_id})
+
+
+def test_update_hands_off_to_the_old_session_until_the_new_one_is_warm(monkeypatch):
+    sc, cache, submitted = _install_stubs(monkeypatch)
+    old_client = object()
+    cache.put("tinker://v1", old_client, sc.holder)
+
+    _update("alias", "tinker://v1", "tinker://v2")
+    assert asyncio.run(get_alias_sampling_client(sc, "alias", "tinker://v2")) == ("tinker://v1", old_client)
+
+    asyncio.run(submitted.pop())
+    model_id, client = asyncio.run(get_alias_sampling_client(sc, "alias", "tinker://v2"))
+    assert (model_id, client.model) == ("tinker://v2", "tinker://v2")
+    assert sc.created == ["tinker://v2"]
+
+
+def test_update_prewarms_even_without_a_live_old_session(monkeypatch):
+    sc, cache, submitted = _install_stubs(monkeypatch)
+
+    _update("alias", "tinker://v1", "tinker://v2")
+    assert cache.get_handoff("alias", "tinker://v2", sc.holder) is None
+    assert len(submitted) == 1
+
+    asyncio.run(submitted.pop())
+    assert cache.peek("tinker://v2") is not None
+    asyncio.run(get_alias_sampling_client(sc, "alias", "tinker://v2"))
+    assert sc.created == ["tinker://v2"]
+
+
+def test_feedback_handoff_is_kept_when_the_new_checkpoint_is_already_cached(monkeypatch):
+    sc, cache, submitted = _install_stubs(monkeypatch)
+    sampler = object()
+    cache.put("tinker://v1", object(), sc.holder)
+
+    # A feedback round serves its trained weights before and after the checkpoint save.
+    cache.hand_off("alias", "tinker://v1", "ephemeral://alias/1", sampler, sc.holder)
+    cache.put("tinker://v2", sampler, sc.holder)
+    _update("alias", "tinker://v1", "tinker://v2")
+
+    assert submitted == []
+    assert cache.get_handoff("alias", "tinker://v1", sc.holder) == ("ephemeral://alias/1", sampler)
+    assert asyncio.run(get_alias_sampling_client(sc, "alias", "tinker://v2")) == ("tinker://v2", sampler)
@@ -0,0 +1,17 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from api._lib.asgi import dispatch
+from api._lib.http_utils import Request
+
+
+def test_stats_route_reports_every_counter():
+    response = asyncio.run(dispatch(Request("GET", "/api/stats", {}, b"", "")))
+    assert response.status == 200
+    stats = json.loads(response.body)
+    assert stats["sample_flight"].keys() == {"in_flight", "leaders", "coalesced"}
+    assert "queue_depth" in stats["handler_loop"] and "loop_lag_sec" in stats["handler_loop"]
@@ -0,0 +1,72 @@
+import asyncio
+import contextlib
+import json
+import types as pytypes
+
+import api._lib.chat_handler as chat_handler
+
+
+class CharTokenizer:
+    """One token per character, so token and text boundaries line up exactly."""
+
+    def decode(self, ids, skip_special_tokens=True):
+        return "".join(chr(i) for i in ids)
+
+
+def _install_stubs(monkeypatch, windows):
+    windows = list(windows)
+
+    @contextlib.asynccontextmanager
+    async def service_client_async():
+        yield pytypes.SimpleNamespace(holder=object())
+
+    async def get_alias_sampling_client(sc, alias, model_id):
+        return model_id, object()
+
+    async def sample(model_id, client, tokens, params, num_samples=1):
+        text, stop_reason = windows.pop(0)
+        seq = pytypes.SimpleNamespace(
+            tokens=[ord(c) for c in text], logprobs=[-float(ord(c)) for c in text], stop_reason=stop_reason)
+        return pytypes.SimpleNamespace(sequences=[seq])
+
+    monkeypatch.setattr(chat_handler, "service_client_async", service_client_async)
+    monkeypatch.setattr(chat_handler, "get_alias_sampling_client", get_alias_sampling_client)
+    monkeypatch.setattr(chat_handler, "_sample", sample)
+
+
+def _stream(stop):
+    ctx = pytypes.SimpleNamespace(
+        data={}, model_alias="alias", model_to_use="model", conversation=None, tokenizer=CharTokenizer(),
+        prompt=pytypes.SimpleNamespace(tokens=[1, 2, 3]), stop=stop, sampling_params=lambda window: None,
+    )
+
+    async def collect():
+        return [json.loads(event[len("data: "):]) async for event in chat_handler.stream_chat(ctx)]
+
+    return asyncio.run(collect())
+
+
+def _check_deltas_match_done(events):
+    deltas = [e for e in events if e["type"] == "delta"]
+    done = events[-1]
+    assert done["type"] == "done"
+    assert "".join(d["text"] for d in deltas) == done["output"]
+    assert [t for d in deltas for t in d["tokens"]] == done["tokens"]
+    assert [lp for d in deltas for lp in d["logprobs"]] == done["logprobs"]
+    return deltas, done
+
+
+def test_stop_string_across_windows_never_streams_trimmed_tokens(monkeypatch):
+    _install_stubs(monkeypatch, [("Hello\nUs", "length"), ("er: more", "length")])
+    deltas, done = _check_deltas_match_done(_stream(["\nUser:"]))
+    assert done["output"] == "Hello"
+    # The "\nUs" tail is held back with the text until the next window settles it.
+    assert deltas[0]["text"] == "Hello"
+    assert deltas[0]["tokens"] == [ord(c) for c in "Hello"]
+
+
+def test_held_back_tokens_follow_when_stop_string_does_not_complete(monkeypatch):
+    _install_stubs(monkeypatch, [("Hi\nUs", "length"), ("ually", "stop")])
+    deltas, done = _check_deltas_match_done(_stream(["\nUser:"]))
+    assert done["output"] == "Hi\nUsually"
+    assert deltas[0]["tokens"] == [ord(c) for c in "Hi"]
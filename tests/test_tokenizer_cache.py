@@ -0,0 +1,37 @@
+from api._lib.models_handler import FALLBACK_MODELS
+from api._lib.tokenizer_cache import TokenizerCache
+
+
+def _make_cache(fail=(), max_size=8):
+    loads = []
+
+    def loader(name):
+        loads.append(name)
+        if name in fail:
+            raise OSError(f"cannot load {name}")
+        return object()
+
+    return TokenizerCache(max_size=max_size, loader=loader), loads
+
+
+def test_models_of_one_family_share_one_tokenizer():
+    cache, loads = _make_cache()
+    first = cache.get("Qwen/Qwen3-8B-Base")
+    assert cache.get("Qwen/Qwen3-235B-A22B-Instruct-2507") is first
+    assert loads == ["Qwen/Qwen3-8B"]
+    assert cache.stats()["size"] == 1
+
+
+def test_fallback_is_shared_after_the_family_tokenizer_fails():
+    cache, loads = _make_cache(fail={"meta-llama/Llama-3.1-8B"})
+    first = cache.get("meta-llama/Llama-3.3-70B")
+    assert cache.get("meta-llama/Llama-3.2-1B") is first
+    assert loads == ["meta-llama/Llama-3.1-8B", "gpt2"]
+    assert cache.resolved_name("meta-llama/Llama-3.2-1B") == "gpt2"
+
+
+def test_preload_loads_each_distinct_tokenizer_once():
+    cache, loads = _make_cache()
+    cache.preload(FALLBACK_MODELS).join()
+    assert sorted(loads) == ["Qwen/Qwen3-8B", "meta-llama/Llama-3.1-8B"]
+    assert all(cache.peek(model) is not None for model in FALLBACK_MODELS)
@@ -0,0 +1,67 @@
+import asyncio
+import types as pytypes
+
+import pytest
+
+from api._lib.training_pool import TrainingClientPool
+
+
+class FlakyTrainingClient:
+    def __init__(self, fail_loads):
+        self.fail_loads = fail_loads
+        self.loaded = []
+
+    async def load_state_async(self, path):
+        if self.fail_loads:
+            self.fail_loads -= 1
+            raise RuntimeError("load failed")
+        self.loaded.append(path)
+
+
+class FakeServiceClient:
+    def __init__(self, fail_loads):
+        self.holder = object()
+        self.clients = []
+        self._fail_loads = fail_loads
+
+    async def create_lora_training_client_async(self, base_model, rank):
+        client = FlakyTrainingClient(self._fail_loads)
+        self._fail_loads = 0
+        self.clients.append(client)
+        return client
+
+
+def test_failed_checkpoint_load_aborts_the_lease():
+    pool = TrainingClientPool()
+    sc = FakeServiceClient(fail_loads=1)
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            async with pool.lease(sc, "alias", "base", "tinker://v2"):
+                raise AssertionError("trained on stale weights")
+
+        # The next lease starts over with a fresh client and loads the checkpoint.
+        async with pool.lease(sc, "alias", "base", "tinker://v2") as entry:
+            return entry.loaded_path
+
+    assert asyncio.run(run()) == "tinker://v2"
+    assert len(sc.clients) == 2
+    assert sc.clients[1].loaded == ["tinker://v2"]
+
+
+def test_cancelled_load_is_not_swallowed():
+    pool = TrainingClientPool()
+    sc = FakeServiceClient(fail_loads=0)
+
+    async def run():
+        async def cancelled_load(path):
+            raise asyncio.CancelledError()
+
+        async with pool.lease(sc, "alias", "base", "base"):
+            pass
+        sc.clients[0].load_state_async = cancelled_load
+        async with pool.lease(sc, "alias", "base", "tinker://v1"):
+            raise AssertionError("trained on stale weights")
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(run())